@@ -0,0 +1,363 @@
+"""Streaming alerts on liquidation and funding data.
+
+The pipeline hands every freshly fetched batch to :class:`AlertEngine`.
+The engine remembers the newest timestamp per dataset and symbol, feeds
+only rows it has not seen before into the rules and keeps all state in
+small rolling aggregates, so no history is ever rescanned:
+
+* :class:`SlidingWindow` - last ``size`` values with a running sum
+* :class:`Ewma`          - exponentially weighted moving average
+* :class:`QuantileSketch` - log-bucketed histogram with relative error
+  ``accuracy`` that supports removing values, so percentiles follow the
+  sliding window
+
+Each rule keeps one state object per symbol and returns an alert dict when
+it fires. The first batch for a symbol only warms the state up; it can
+fire on its newest row but not on the history before it. When the engine
+knows the candle ``interval``, a candle is only judged once it has closed,
+so the still-open newest candle of a response never enters the state.
+
+Scheduled one-shot runs keep their progress with :meth:`AlertEngine.save`
+and :meth:`AlertEngine.load`, which store the last seen timestamps and the
+rule states as JSON, so the next run continues instead of warming up again.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+# Seconds per unit of an interval such as "5m", "4h" or "1d"
+INTERVAL_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def interval_seconds(interval: str) -> int:
+    """Return the length of a candle interval like ``"4h"`` in seconds."""
+    count, unit = interval[:-1], interval[-1:]
+    if not count.isdigit() or unit not in INTERVAL_UNITS:
+        raise ValueError(f"Unknown interval '{interval}'")
+    return int(count) * INTERVAL_UNITS[unit]
+
+
+def _seconds(timestamp: int) -> float:
+    # Coinglass timestamps are in milliseconds; accept seconds as well
+    return timestamp / 1000 if timestamp > 10**11 else timestamp
+
+
+class SlidingWindow:
+    """Fixed-size window of recent values with an O(1) running sum."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.values: deque = deque()
+        self.total = 0.0
+
+    def add(self, value: float) -> float | None:
+        """Add ``value`` and return the evicted value, if any."""
+        self.values.append(value)
+        self.total += value
+        if len(self.values) > self.size:
+            old = self.values.popleft()
+            self.total -= old
+            return old
+        return None
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def mean(self) -> float:
+        return self.total / len(self.values) if self.values else 0.0
+
+
+class Ewma:
+    """Exponentially weighted moving average."""
+
+    def __init__(self, alpha: float) -> None:
+        self.alpha = alpha
+        self.value: float | None = None
+
+    def add(self, value: float) -> float:
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class QuantileSketch:
+    """Approximate quantiles of non-negative values with add and remove.
+
+    Values are counted in logarithmic buckets so every estimate is within
+    ``accuracy`` (relative) of a true value. Values ``<= 0`` share a bucket.
+    """
+
+    def __init__(self, accuracy: float = 0.01) -> None:
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: dict[int, int] = {}
+        self.zeros = 0
+        self.count = 0
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value <= 0:
+            self.zeros += 1
+            return
+        i = self._index(value)
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+
+    def remove(self, value: float) -> None:
+        self.count -= 1
+        if value <= 0:
+            self.zeros -= 1
+            return
+        i = self._index(value)
+        self.buckets[i] -= 1
+        if not self.buckets[i]:
+            del self.buckets[i]
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if rank < seen:
+                return 2 * self.gamma**i / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class LiquidationImbalanceRule:
+    """Fire when one side dominates the liquidations of a candle."""
+
+    dataset = "liquidations"
+    name = "liquidation_imbalance"
+
+    def __init__(self, threshold: float = 0.8, min_usd: float = 1_000_000) -> None:
+        self.threshold = threshold
+        self.min_usd = min_usd
+
+    def new_state(self) -> None:
+        return None
+
+    def dump_state(self, state) -> None:
+        return None
+
+    def load_state(self, data) -> None:
+        return None
+
+    def update(self, state, row: dict) -> dict | None:
+        longs = float(row["aggregated_long_liquidation_usd"])
+        shorts = float(row["aggregated_short_liquidation_usd"])
+        total = longs + shorts
+        if total < self.min_usd:
+            return None
+        share = longs / total
+        if share >= self.threshold:
+            return {"value": share, "message": f"{share:.0%} of ${total:,.0f} liquidated were longs"}
+        if share <= 1 - self.threshold:
+            return {"value": share, "message": f"{1 - share:.0%} of ${total:,.0f} liquidated were shorts"}
+        return None
+
+
+class LiquidationSpikeRule:
+    """Fire when total liquidations exceed ``factor`` times a window percentile."""
+
+    dataset = "liquidations"
+    name = "liquidation_spike"
+
+    def __init__(self, factor: float = 3.0, quantile: float = 0.9, window: int = 180) -> None:
+        self.factor = factor
+        self.quantile = quantile
+        self.window = window
+
+    def new_state(self) -> dict:
+        return {"window": SlidingWindow(self.window), "sketch": QuantileSketch()}
+
+    def dump_state(self, state: dict) -> list[float]:
+        return list(state["window"].values)
+
+    def load_state(self, data: list[float]) -> dict:
+        # The sketch is rebuilt from the window, which also applies a
+        # changed window size
+        state = self.new_state()
+        for value in data[-self.window :]:
+            state["window"].add(value)
+            state["sketch"].add(value)
+        return state
+
+    def update(self, state: dict, row: dict) -> dict | None:
+        total = float(row["aggregated_long_liquidation_usd"]) + float(
+            row["aggregated_short_liquidation_usd"]
+        )
+        window, sketch = state["window"], state["sketch"]
+        # Compare with the window before adding the new value
+        alert = None
+        if len(window) >= min(30, self.window):
+            level = sketch.quantile(self.quantile)
+            if level > 0 and total > self.factor * level:
+                alert = {
+                    "value": total,
+                    "message": f"${total:,.0f} liquidated, {total / level:.1f}x the p{self.quantile * 100:.0f}",
+                }
+        evicted = window.add(total)
+        sketch.add(total)
+        if evicted is not None:
+            sketch.remove(evicted)
+        return alert
+
+
+class FundingFlipRule:
+    """Fire when the smoothed funding rate changes sign."""
+
+    dataset = "funding_rate"
+    name = "funding_flip"
+
+    def __init__(self, alpha: float = 0.5, min_rate: float = 0.0001) -> None:
+        self.alpha = alpha
+        self.min_rate = min_rate
+
+    def new_state(self) -> dict:
+        return {"ewma": Ewma(self.alpha), "sign": 0}
+
+    def dump_state(self, state: dict) -> dict:
+        return {"ewma": state["ewma"].value, "sign": state["sign"]}
+
+    def load_state(self, data: dict) -> dict:
+        state = self.new_state()
+        state["ewma"].value = data["ewma"]
+        state["sign"] = data["sign"]
+        return state
+
+    def update(self, state: dict, row: dict) -> dict | None:
+        rate = state["ewma"].add(float(row["close"]))
+        if abs(rate) < self.min_rate:
+            return None
+        sign = 1 if rate > 0 else -1
+        previous, state["sign"] = state["sign"], sign
+        if previous and sign != previous:
+            side = "positive" if sign > 0 else "negative"
+            return {"value": rate, "message": f"funding turned {side} ({rate:.4%})"}
+        return None
+
+
+def default_rules() -> list:
+    return [LiquidationImbalanceRule(), LiquidationSpikeRule(), FundingFlipRule()]
+
+
+class AlertEngine:
+    """Run rules over newly ingested rows and deliver the alerts."""
+
+    def __init__(
+        self,
+        rules: list | None = None,
+        alerts_file: str | None = None,
+        interval: float | None = None,
+    ) -> None:
+        self.rules = default_rules() if rules is None else rules
+        self.alerts_file = alerts_file
+        # Candle length in seconds; rows are skipped until their candle closed
+        self.interval = interval
+        self._last_time: dict[tuple[str, str], int] = {}
+        self._states: dict[tuple[str, str], object] = {}
+        self._lock = threading.Lock()
+
+    def save(self, path: str | Path) -> None:
+        """Write the last seen timestamps and rule states to ``path``."""
+        names = {rule.name: rule for rule in self.rules}
+        with self._lock:
+            data = {
+                "last_time": [[d, s, t] for (d, s), t in sorted(self._last_time.items())],
+                "states": [
+                    [name, symbol, names[name].dump_state(state)]
+                    for (name, symbol), state in sorted(self._states.items())
+                    if name in names
+                ],
+            }
+        tmp = Path(f"{path}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def load(self, path: str | Path) -> bool:
+        """Restore state written by :meth:`save`; ``False`` if there is none.
+
+        States of rules that are no longer configured are ignored.
+        """
+        if not Path(path).exists():
+            return False
+        with open(path, "r") as f:
+            data = json.load(f)
+        names = {rule.name: rule for rule in self.rules}
+        with self._lock:
+            self._last_time = {(d, s): int(t) for d, s, t in data.get("last_time", [])}
+            self._states = {
+                (name, symbol): names[name].load_state(state)
+                for name, symbol, state in data.get("states", [])
+                if name in names
+            }
+        return True
+
+    def observe(self, dataset: str, symbol: str, rows: list[dict]) -> list[dict]:
+        """Feed a fetched batch of ``dataset`` rows for ``symbol``.
+
+        Returns the alerts that fired; they are also logged and written to
+        ``alerts_file`` when one is set.
+        """
+        rules = [r for r in self.rules if r.dataset == dataset]
+        if not rules:
+            return []
+        with self._lock:
+            alerts = self._observe(rules, dataset, symbol, rows)
+        for alert in alerts:
+            self._deliver(alert)
+        return alerts
+
+    def _observe(self, rules: list, dataset: str, symbol: str, rows: list[dict]) -> list[dict]:
+        key = (dataset, symbol)
+        last = self._last_time.get(key)
+        now = time.time()
+        fresh = sorted(
+            (
+                r
+                for r in rows
+                if (last is None or int(r["time"]) > last)
+                and (self.interval is None or _seconds(int(r["time"])) + self.interval <= now)
+            ),
+            key=lambda r: int(r["time"]),
+        )
+        if not fresh:
+            return []
+        alerts = []
+        for n, row in enumerate(fresh):
+            # The first batch is history: only its newest row may alert
+            silent = last is None and n < len(fresh) - 1
+            for rule in rules:
+                state_key = (rule.name, symbol)
+                if state_key not in self._states:
+                    self._states[state_key] = rule.new_state()
+                fired = rule.update(self._states[state_key], row)
+                if fired and not silent:
+                    alerts.append(
+                        {"time": int(row["time"]), "symbol": symbol, "rule": rule.name, **fired}
+                    )
+        self._last_time[key] = int(fresh[-1]["time"])
+        return alerts
+
+    def _deliver(self, alert: dict) -> None:
+        logging.warning("ALERT %s %s: %s", alert["symbol"], alert["rule"], alert["message"])
+        if self.alerts_file:
+            with open(self.alerts_file, "a") as f:
+                f.write(json.dumps(alert) + "\n")
@@ -1,8 +1,53 @@
+import os
 import urllib.parse
-import requests
+
+import bandwidth
 
 BASE_URL = "https://open-api-v4.coinglass.com"
 
+# Environment variables that select a cassette (see cassette.py)
+CASSETTE_ENV = "COINGLASS_CASSETTE"
+MODE_ENV = "COINGLASS_CASSETTE_MODE"
+SPEED_ENV = "COINGLASS_REPLAY_SPEED"
+
+# Shared HTTP session, created on first use (see get_session)
+_session = None
+
+
+def replay_active() -> bool:
+    """Return ``True`` when responses come from a cassette, not the network."""
+    return bool(os.getenv(CASSETTE_ENV)) and os.getenv(MODE_ENV, "replay").lower() == "replay"
+
+
+def new_session():
+    """Return a new HTTP session, wrapped for record/replay if configured.
+
+    ``requests`` and ``cassette`` are imported here, not at module level, so
+    they are only loaded right before the first request.
+    """
+    import requests
+
+    session = requests.Session()
+    if os.getenv(CASSETTE_ENV):
+        from cassette import wrap_session
+
+        session = wrap_session(session)
+    return session
+
+
+def get_session():
+    """Return the session used by :func:`fetch`."""
+    global _session
+    if _session is None:
+        _session = new_session()
+    return _session
+
+
+def set_session(session) -> None:
+    """Replace the session used by :func:`fetch`, e.g. with a replay session."""
+    global _session
+    _session = session
+
 
 def fetch(endpoint: str, params: dict | None = None, api_key: str | None = None) -> dict:
     """Return JSON data from the given Coinglass endpoint."""
@@ -10,7 +55,10 @@ def fetch(endpoint: str, params: dict | None = None, api_key: str | None = None)
     headers = {}
     if api_key:
         headers["CG-API-KEY"] = api_key
-    resp = requests.get(url, headers=headers, params=params)
+    session = get_session()
+    bandwidth.note_request()
+    resp = session.get(url, headers=headers, params=params)
+    bandwidth.record_response(resp)
     if resp.status_code == 401:
         raise RuntimeError("Unauthorized. Check your API key.")
     if resp.status_code == 429:
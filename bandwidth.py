@@ -0,0 +1,99 @@
+"""Per-endpoint transfer accounting.
+
+Every response that goes through ``api_utils.fetch`` or ``CoinglassClient``
+is recorded here with two sizes:
+
+* ``wire``  - bytes received over the network (compressed when the server
+  used gzip/deflate)
+* ``raw``   - bytes of the decoded body
+
+The collector prints :func:`format_report` after each sweep so it is easy
+to see which endpoints dominate egress and how much compression saves.
+``requests`` already asks for ``gzip, deflate`` on every request, so the
+savings come from ``--limit`` on history endpoints; this module only makes
+them visible. Responses are not streamed because every caller needs the
+complete JSON document anyway.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import urllib.parse
+
+_lock = threading.Lock()
+_stats: dict[str, dict[str, int]] = {}
+# time.perf_counter() when the first request of the process was sent
+_first_request: float | None = None
+
+
+def note_request() -> None:
+    """Mark that a request is about to be sent; only the first one is kept."""
+    global _first_request
+    if _first_request is None:
+        _first_request = time.perf_counter()
+
+
+def first_request_time() -> float | None:
+    """Return the ``time.perf_counter()`` of the first request, if any."""
+    return _first_request
+
+
+def response_sizes(resp) -> tuple[int, int]:
+    """Return ``(wire, raw)`` byte counts of a received response."""
+    raw = len(resp.content)
+    wire = getattr(resp, "wire_bytes", None)
+    if wire is None:
+        try:
+            # urllib3 counts the bytes pulled from the socket, before decoding
+            wire = resp.raw.tell()
+        except (AttributeError, OSError, ValueError):
+            wire = None
+    if not wire:
+        length = resp.headers.get("content-length") if resp.headers else None
+        wire = int(length) if length and str(length).isdigit() else raw
+    return wire, raw
+
+
+def record(url: str, wire: int, raw: int) -> None:
+    """Add one response of ``url`` to the running totals."""
+    endpoint = urllib.parse.urlsplit(url).path or url
+    with _lock:
+        entry = _stats.setdefault(endpoint, {"requests": 0, "wire": 0, "raw": 0})
+        entry["requests"] += 1
+        entry["wire"] += wire
+        entry["raw"] += raw
+
+
+def record_response(resp) -> tuple[int, int]:
+    """Record ``resp`` and return its ``(wire, raw)`` sizes."""
+    wire, raw = response_sizes(resp)
+    record(resp.url, wire, raw)
+    return wire, raw
+
+
+def snapshot() -> dict[str, dict[str, int]]:
+    with _lock:
+        return {k: dict(v) for k, v in _stats.items()}
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+
+
+def format_report(top: int = 10) -> str:
+    """Return totals and the ``top`` endpoints by bytes on the wire."""
+    stats = snapshot()
+    wire = sum(s["wire"] for s in stats.values())
+    raw = sum(s["raw"] for s in stats.values())
+    requests = sum(s["requests"] for s in stats.values())
+    ratio = f"{raw / wire:.1f}x" if wire else "n/a"
+    lines = [
+        f"Transferred {wire / 1024:.1f} kB for {raw / 1024:.1f} kB of data "
+        f"in {requests} requests (compression {ratio})"
+    ]
+    ranked = sorted(stats.items(), key=lambda item: item[1]["wire"], reverse=True)
+    for endpoint, s in ranked[:top]:
+        lines.append(f"  {s['wire'] / 1024:9.1f} kB  {s['raw'] / 1024:9.1f} kB  {endpoint}")
+    return "\n".join(lines)
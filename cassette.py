@@ -0,0 +1,160 @@
+"""Record and replay Coinglass HTTP traffic for offline runs.
+
+Every script talks to the API through a ``requests.Session`` (see
+``api_utils.get_session`` and ``CoinglassClient``). :func:`wrap_session`
+swaps that session for one of two stand-ins:
+
+* :class:`RecordingSession` forwards requests to the real session and
+  writes each response, with its latency, to a gzip compressed JSON lines
+  cassette. The cassette is started afresh by the first recording session
+  of a run. Request headers, and with them the API key, are never stored.
+* :class:`ReplaySession` serves responses from a cassette without touching
+  the network. Each response is delayed by its recorded latency divided by
+  ``speed`` (``0`` disables the delay), so runs are repeatable bit for bit.
+
+The mode is selected with environment variables so it applies to every
+script at once::
+
+    COINGLASS_CASSETTE=run.jsonl.gz COINGLASS_CASSETTE_MODE=record python coinglass_pipeline.py
+    COINGLASS_CASSETTE=run.jsonl.gz COINGLASS_CASSETTE_MODE=replay python coinglass_pipeline.py
+
+``python coinglass.py --record FILE`` and ``--replay FILE`` set them for you.
+"""
+
+from __future__ import annotations
+
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+from api_utils import CASSETTE_ENV, MODE_ENV, SPEED_ENV
+from bandwidth import response_sizes
+
+# Response headers worth keeping; everything else varies between runs
+KEPT_HEADERS = ("content-type", "content-encoding", "content-length")
+
+# Shared by all recording sessions so threads never interleave writes
+_write_lock = threading.Lock()
+# Cassettes already truncated by this process
+_started_paths: set[str] = set()
+
+
+def _request_key(method: str, url: str, params) -> tuple:
+    if isinstance(params, dict):
+        items = params.items()
+    else:
+        items = params or []
+    return (
+        method.upper(),
+        url,
+        tuple(sorted((str(k), str(v)) for k, v in items if v is not None)),
+    )
+
+
+class ReplayResponse:
+    """Minimal stand-in for ``requests.Response`` built from a cassette entry."""
+
+    def __init__(self, entry: dict) -> None:
+        self.url = entry["url"]
+        self.status_code = entry["status"]
+        self.headers = dict(entry.get("headers", {}))
+        self.content = base64.b64decode(entry["body"])
+        self.elapsed_seconds = entry.get("elapsed", 0.0)
+        self.wire_bytes = entry.get("wire_bytes")
+        self.encoding = "utf-8"
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class RecordingSession:
+    """Wrap a real session and record every response to ``path``."""
+
+    def __init__(self, session, path: str) -> None:
+        self.session = session
+        self.path = path
+        # Sessions for several threads share one cassette; only the first
+        # one clears what an earlier run left behind.
+        with _write_lock:
+            key = os.path.abspath(path)
+            if key not in _started_paths:
+                _started_paths.add(key)
+                with gzip.open(path, "wt"):
+                    pass
+
+    @property
+    def headers(self):
+        return self.session.headers
+
+    def get(self, url: str, params=None, **kwargs):
+        started = time.monotonic()
+        resp = self.session.get(url, params=params, **kwargs)
+        elapsed = time.monotonic() - started
+        entry = {
+            "method": "GET",
+            "url": url,
+            "params": list(_request_key("GET", url, params)[2]),
+            "status": resp.status_code,
+            "headers": {k: v for k, v in resp.headers.items() if k.lower() in KEPT_HEADERS},
+            "body": base64.b64encode(resp.content).decode("ascii"),
+            "elapsed": round(elapsed, 6),
+            "wire_bytes": response_sizes(resp)[0],
+        }
+        with _write_lock:
+            # Each write is its own gzip member, so a crash never corrupts
+            # what was recorded before it.
+            with gzip.open(self.path, "at") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        return resp
+
+
+class ReplaySession:
+    """Serve recorded responses in the order they were captured."""
+
+    def __init__(self, path: str, speed: float = 1.0) -> None:
+        self.path = path
+        self.speed = speed
+        self.headers: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._entries: dict[tuple, deque] = defaultdict(deque)
+        with gzip.open(path, "rt") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    key = (entry["method"], entry["url"], tuple(map(tuple, entry["params"])))
+                    self._entries[key].append(entry)
+
+    def get(self, url: str, params=None, **kwargs):
+        key = _request_key("GET", url, params)
+        with self._lock:
+            queue = self._entries.get(key)
+            if not queue:
+                raise RuntimeError(f"No recorded response for {url} with params {dict(key[2])}")
+            entry = queue.popleft()
+        if self.speed > 0:
+            time.sleep(entry.get("elapsed", 0.0) / self.speed)
+        return ReplayResponse(entry)
+
+
+def wrap_session(session):
+    """Return ``session`` wrapped for recording or replay if configured.
+
+    Returns the session unchanged when ``COINGLASS_CASSETTE`` is not set.
+    """
+    path = os.getenv(CASSETTE_ENV)
+    if not path:
+        return session
+    mode = os.getenv(MODE_ENV, "replay").lower()
+    if mode == "record":
+        return RecordingSession(session, path)
+    if mode == "replay":
+        return ReplaySession(path, float(os.getenv(SPEED_ENV, "1")))
+    raise RuntimeError(f"Unknown {MODE_ENV} '{mode}'. Use 'record' or 'replay'.")
@@ -0,0 +1,105 @@
+"""Single command line entry point for the Coinglass scripts.
+
+Usage::
+
+    python coinglass.py [--timings] [--record FILE | --replay FILE [--speed N]]
+                        <command> [options]
+
+Each command runs one of the existing scripts with the remaining options,
+for example ``python coinglass.py collect --output-dir data`` or
+``python coinglass.py category futures --output-dir futures``. Only the
+module needed by the chosen command is imported, so short jobs launched by
+a scheduler do not pay for loading everything else. ``--timings`` (or the
+``COINGLASS_TIMINGS`` environment variable) prints how long the import took
+and how long it took until the first API request was sent.
+
+``--record FILE`` saves every API response to a cassette and ``--replay
+FILE`` serves them back without network access; ``--speed`` divides the
+recorded latencies during replay (``0`` for no delay). See ``cassette.py``.
+"""
+
+import importlib
+import os
+import sys
+import time
+
+import bandwidth
+from api_utils import CASSETTE_ENV, MODE_ENV, SPEED_ENV
+
+# command -> (module, description)
+COMMANDS = {
+    "collect": ("coinglass_collector", "Download every endpoint with rate limiting"),
+    "category": ("fetch_by_category", "Download all endpoints of one category"),
+    "hobbyist": ("fetch_hobbyist_endpoints", "Download the hobbyist endpoint list"),
+    "pipeline": ("coinglass_pipeline", "Store futures statistics in SQLite"),
+    "current-oi": ("current_oi", "Save current open interest for a symbol"),
+    "scrape": ("coinglass_scraper", "Save example indicators as CSV files"),
+}
+
+
+def usage() -> str:
+    lines = [
+        "usage: coinglass [--timings] [--record FILE | --replay FILE [--speed N]]",
+        "                 <command> [options]",
+        "",
+        "commands:",
+    ]
+    for name, (_, description) in COMMANDS.items():
+        lines.append(f"  {name:<12}{description}")
+    lines.append("")
+    lines.append("Run 'coinglass <command> --help' for the options of a command.")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    timings = bool(os.getenv("COINGLASS_TIMINGS"))
+    while argv and argv[0] in ("--timings", "--record", "--replay", "--speed"):
+        option = argv.pop(0)
+        if option == "--timings":
+            timings = True
+            continue
+        if not argv:
+            print(f"coinglass: {option} needs a value", file=sys.stderr)
+            return 2
+        value = argv.pop(0)
+        if option == "--speed":
+            os.environ[SPEED_ENV] = value
+        else:
+            os.environ[CASSETTE_ENV] = value
+            os.environ[MODE_ENV] = option[2:]
+
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+
+    command, rest = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(f"coinglass: unknown command '{command}'\n", file=sys.stderr)
+        print(usage(), file=sys.stderr)
+        return 2
+
+    # ``coinglass category futures`` is shorthand for ``--category futures``
+    if command == "category" and rest and not rest[0].startswith("-"):
+        rest = ["--category", rest[0]] + rest[1:]
+
+    module_name = COMMANDS[command][0]
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if timings:
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"[coinglass] imported {module_name} in {elapsed:.1f} ms", file=sys.stderr)
+
+    sys.argv = [f"coinglass {command}"] + rest
+    try:
+        module.main()
+    finally:
+        first = bandwidth.first_request_time()
+        if timings and first is not None:
+            elapsed = (first - started) * 1000
+            print(f"[coinglass] first request sent after {elapsed:.1f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,27 @@
 import argparse
-import csv
-import json
 import os
 import re
 import time
 from pathlib import Path
 
-from api_utils import fetch
+import bandwidth
+from api_utils import fetch, replay_active
+from sinks import SnapshotSink, add_sink_arguments, open_sinks
+from snapshot_archive import append_rows
+from snapshot_diff import describe_delta, publish_delta
+from sweep_planner import (
+    format_plan,
+    load_priorities,
+    load_stats,
+    plan_sweep,
+    record_fetch,
+    save_stats,
+)
 
 # How long to wait between requests (seconds) to stay under 20 req/min
 REQUEST_DELAY = 3.1
+# Requests per minute that REQUEST_DELAY was chosen for
+DEFAULT_BUDGET = 20
 
 
 def load_endpoints(file_path: str):
@@ -26,31 +38,22 @@ def load_endpoints(file_path: str):
             yield title, url, category
 
 
+def request_params(url: str, limit: int | None) -> dict | None:
+    """Return query parameters that cap the size of a response.
+
+    Only history endpoints accept ``limit``; other endpoints get none.
+    """
+    if limit and url.rstrip("/").endswith("history"):
+        return {"limit": limit}
+    return None
+
+
 def slugify(text: str) -> str:
     text = text.lower()
     text = re.sub(r"[^a-z0-9]+", "_", text)
     return text.strip("_")
 
 
-def save_response(data, base_path: Path) -> None:
-    """Save data to CSV if possible, otherwise JSON."""
-    if isinstance(data, dict) and "data" in data:
-        content = data["data"]
-    else:
-        content = data
-
-    if isinstance(content, list) and content and isinstance(content[0], dict):
-        out_file = base_path.with_suffix(".csv")
-        with open(out_file, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=content[0].keys())
-            writer.writeheader()
-            writer.writerows(content)
-    else:
-        out_file = base_path.with_suffix(".json")
-        with open(out_file, "w") as f:
-            json.dump(content, f, indent=2)
-
-
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Download multiple Coinglass endpoints with rate limiting",
@@ -68,31 +71,116 @@ def main() -> None:
         default="endpoints.txt",
         help="Path to the file listing endpoints",
     )
+    parser.add_argument(
+        "--archive-dir",
+        help="Also append time series responses to a memory-mapped archive here",
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="Publish market-wide tables as NDJSON deltas instead of full files",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET,
+        help="Maximum requests per minute",
+    )
+    parser.add_argument(
+        "--window",
+        type=float,
+        help="Sweep length in minutes; endpoints that do not fit are deferred",
+    )
+    parser.add_argument(
+        "--priorities",
+        help="JSON file mapping URL fragments to priorities (default 1)",
+    )
+    parser.add_argument(
+        "--stats-file",
+        help="JSON file with observed latency, size and change rate per endpoint",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        help="Only request the most recent N rows from history endpoints",
+    )
+    add_sink_arguments(parser)
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the planned schedule and exit without fetching",
+    )
 
     args = parser.parse_args()
+    if args.budget <= 0:
+        parser.error("--budget must be positive")
+
+    stats = load_stats(args.stats_file)
+    schedule, deferred = plan_sweep(
+        load_endpoints(args.endpoints),
+        stats,
+        load_priorities(args.priorities),
+        args.budget,
+        args.window,
+    )
+    if args.dry_run:
+        print(format_plan(schedule, deferred))
+        return
+
     api_key = args.api_key or env_key
     if not api_key:
         parser.error("An API key is required. Use --api-key or set COINGLASS_API_KEY.")
 
     base_dir = Path(args.output_dir)
     base_dir.mkdir(parents=True, exist_ok=True)
-
-    for title, url, category in load_endpoints(args.endpoints):
-        cat_dir = base_dir / category
-        cat_dir.mkdir(parents=True, exist_ok=True)
-        file_base = cat_dir / slugify(title)
+    sinks = open_sinks(args, base_dir, lambda **kw: SnapshotSink(base_dir, **kw))
+    delay = REQUEST_DELAY * DEFAULT_BUDGET / args.budget
+    replay = replay_active()
+    bandwidth.reset()
+
+    try:
+        for item in schedule:
+            title, url, category = item["title"], item["url"], item["category"]
+            started = time.monotonic()
+            cat_dir = base_dir / category
+            cat_dir.mkdir(parents=True, exist_ok=True)
+            file_base = cat_dir / slugify(title)
+            try:
+                data = fetch(url, request_params(url, args.limit), api_key=api_key)
+                record_fetch(stats, url, time.monotonic() - started, data)
+                delta = publish_delta(data, file_base, url) if args.delta else None
+                if delta is None:
+                    sinks.write(f"{category}/{slugify(title)}", data)
+                if delta is not None:
+                    print(f"Fetched {title} ({describe_delta(delta)})")
+                else:
+                    print(f"Fetched {title}")
+            except Exception as exc:
+                with open(file_base.with_suffix(".txt"), "w") as f:
+                    f.write(str(exc))
+                print(f"Failed to fetch {title}: {exc}")
+            else:
+                if args.archive_dir:
+                    try:
+                        append_rows(args.archive_dir, url, "ALL", data)
+                    except (OSError, ValueError) as exc:
+                        print(f"Failed to archive {title}: {exc}")
+
+            # wait to respect rate limit; time spent on the request counts too.
+            # A replayed cassette has no rate limit and paces itself by --speed.
+            if not replay:
+                time.sleep(max(0.0, delay - (time.monotonic() - started)))
+    finally:
+        # Buffered rows are only on disk once the sinks are closed. The
+        # observations are kept even when the sweep is interrupted.
         try:
-            data = fetch(url, api_key=api_key)
-            save_response(data, file_base)
-            print(f"Fetched {title}")
-        except Exception as exc:
-            with open(file_base.with_suffix(".txt"), "w") as f:
-                f.write(str(exc))
-            print(f"Failed to fetch {title}: {exc}")
-
-        # wait to respect rate limit
-        time.sleep(REQUEST_DELAY)
-
+            sinks.close()
+        finally:
+            if args.stats_file:
+                save_stats(stats, args.stats_file)
+    if deferred:
+        print(f"Deferred {len(deferred)} endpoints that did not fit the window")
+    print(bandwidth.format_report())
     print(f"Saved data to {base_dir}/")
 
 
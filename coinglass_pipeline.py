@@ -14,11 +14,24 @@ from __future__ import annotations
 import argparse
 import logging
 import os
+import queue
 import sqlite3
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Iterable
 
-import requests
+import bandwidth
+from alerts import (
+    AlertEngine,
+    FundingFlipRule,
+    LiquidationImbalanceRule,
+    LiquidationSpikeRule,
+    interval_seconds,
+)
+from api_utils import new_session, replay_active
+from sinks import add_sink_arguments, open_sinks
+from snapshot_archive import append_rows
 
 
 BASE_URL = "https://open-api-v4.coinglass.com/api"
@@ -31,24 +44,67 @@ ENDPOINTS = {
 }
 
 
-class CoinglassClient:
-    """Simple API client with retry logic."""
+class RateLimiter:
+    """Space requests from all threads at least ``60 / per_minute`` seconds apart."""
+
+    def __init__(self, per_minute: float) -> None:
+        self.spacing = 60.0 / per_minute
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until the caller may send the next request."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.spacing
+        if slot > now:
+            time.sleep(slot - now)
 
-    def __init__(self, api_key: str, base_url: str = BASE_URL) -> None:
+
+class CoinglassClient:
+    """Simple API client with retry logic.
+
+    Clients of several worker threads share one ``limiter`` so that
+    together they stay within the request budget; retries count too.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = BASE_URL,
+        session=None,
+        limiter: RateLimiter | None = None,
+    ) -> None:
         self.api_key = api_key
         self.base_url = base_url
-        self.session = requests.Session()
-        self.session.headers.update({"accept": "application/json", "CG-API-KEY": api_key})
+        self.limiter = limiter
+        self.session = session if session is not None else new_session()
+        self.session.headers.update(
+            {
+                "accept": "application/json",
+                "CG-API-KEY": api_key,
+            }
+        )
+        # Extra query parameters sent with every request, e.g. {"limit": 500}
+        self.default_params: dict = {}
 
     def get(self, endpoint: str, params: dict) -> dict:
+        import requests  # already loaded by new_session()
+
         url = self.base_url + endpoint
+        params = {**self.default_params, **params}
         for attempt in range(3):
+            if self.limiter is not None:
+                self.limiter.wait()
+            bandwidth.note_request()
             try:
                 resp = self.session.get(url, params=params, timeout=10)
             except requests.RequestException as exc:  # network issue
                 logging.warning("Network error: %s", exc)
                 time.sleep(2)
                 continue
+            bandwidth.record_response(resp)
             if resp.status_code != 200:
                 logging.warning("HTTP %s: %s", resp.status_code, resp.text)
                 time.sleep(1)
@@ -87,11 +143,54 @@ class CoinglassClient:
         return self.get(ENDPOINTS["liquidations"], params)
 
 
+INSERT_SQL = {
+    "open_interest": "INSERT OR IGNORE INTO open_interest VALUES (?, ?, ?, ?, ?, ?)",
+    "funding_rate": "INSERT OR IGNORE INTO funding_rate VALUES (?, ?, ?, ?, ?, ?)",
+    "long_short_ratio": "INSERT OR IGNORE INTO long_short_ratio VALUES (?, ?, ?, ?, ?, ?)",
+    "liquidations": "INSERT OR IGNORE INTO liquidations VALUES (?, ?, ?, ?)",
+}
+
+
+def ohlc_rows(symbol: str, data: Iterable[dict]) -> list[tuple]:
+    return [
+        (symbol, int(d["time"]), float(d["open"]), float(d["high"]), float(d["low"]), float(d["close"]))
+        for d in data
+    ]
+
+
+def long_short_rows(symbol: str, exchange: str, data: Iterable[dict]) -> list[tuple]:
+    return [
+        (
+            symbol,
+            exchange,
+            int(d["time"]),
+            float(d.get("top_account_long_percent", 0.0)),
+            float(d.get("top_account_short_percent", 0.0)),
+            float(d.get("top_account_long_short_ratio", 0.0)),
+        )
+        for d in data
+    ]
+
+
+def liquidation_rows(symbol: str, data: Iterable[dict]) -> list[tuple]:
+    return [
+        (
+            symbol,
+            int(d["time"]),
+            float(d["aggregated_long_liquidation_usd"]),
+            float(d["aggregated_short_liquidation_usd"]),
+        )
+        for d in data
+    ]
+
+
 class DataStorage:
     """Store data points in an SQLite database."""
 
-    def __init__(self, db_file: str) -> None:
-        self.conn = sqlite3.connect(db_file)
+    def __init__(self, db_file: str, check_same_thread: bool = True) -> None:
+        # Wait for other processes holding the lock instead of failing at once
+        self.conn = sqlite3.connect(db_file, timeout=30, check_same_thread=check_same_thread)
+        self.conn.execute("PRAGMA journal_mode=WAL")
         self.cur = self.conn.cursor()
         self._ensure_tables()
 
@@ -148,63 +247,136 @@ class DataStorage:
         )
         self.conn.commit()
 
+    def write_rows(self, table: str, rows: list[tuple], commit: bool = True) -> None:
+        """Insert prepared ``rows`` into ``table``, ignoring duplicates."""
+        self.cur.executemany(INSERT_SQL[table], rows)
+        if commit:
+            self.conn.commit()
+
     def insert_open_interest(self, symbol: str, data: Iterable[dict]) -> None:
-        rows = [
-            (symbol, int(d["time"]), float(d["open"]), float(d["high"]), float(d["low"]), float(d["close"]))
-            for d in data
-        ]
-        self.cur.executemany(
-            "INSERT OR IGNORE INTO open_interest VALUES (?, ?, ?, ?, ?, ?)", rows
-        )
-        self.conn.commit()
+        self.write_rows("open_interest", ohlc_rows(symbol, data))
 
     def insert_funding_rate(self, symbol: str, data: Iterable[dict]) -> None:
-        rows = [
-            (symbol, int(d["time"]), float(d["open"]), float(d["high"]), float(d["low"]), float(d["close"]))
-            for d in data
-        ]
-        self.cur.executemany(
-            "INSERT OR IGNORE INTO funding_rate VALUES (?, ?, ?, ?, ?, ?)", rows
-        )
-        self.conn.commit()
+        self.write_rows("funding_rate", ohlc_rows(symbol, data))
 
     def insert_long_short_ratio(self, symbol: str, exchange: str, data: Iterable[dict]) -> None:
-        rows = [
-            (
-                symbol,
-                exchange,
-                int(d["time"]),
-                float(d.get("top_account_long_percent", 0.0)),
-                float(d.get("top_account_short_percent", 0.0)),
-                float(d.get("top_account_long_short_ratio", 0.0)),
-            )
-            for d in data
-        ]
-        self.cur.executemany(
-            "INSERT OR IGNORE INTO long_short_ratio VALUES (?, ?, ?, ?, ?, ?)", rows
-        )
-        self.conn.commit()
+        self.write_rows("long_short_ratio", long_short_rows(symbol, exchange, data))
 
     def insert_liquidations(self, symbol: str, data: Iterable[dict]) -> None:
-        rows = [
-            (
-                symbol,
-                int(d["time"]),
-                float(d["aggregated_long_liquidation_usd"]),
-                float(d["aggregated_short_liquidation_usd"]),
-            )
-            for d in data
-        ]
-        self.cur.executemany(
-            "INSERT OR IGNORE INTO liquidations VALUES (?, ?, ?, ?)", rows
-        )
-        self.conn.commit()
+        self.write_rows("liquidations", liquidation_rows(symbol, data))
 
     def close(self) -> None:
         self.cur.close()
         self.conn.close()
 
 
+class QueuedStorage:
+    """Funnel inserts from many fetch threads into one SQLite writer.
+
+    Fetch workers convert API data to rows on their own thread and put the
+    batch on a queue. A single writer thread owns the connection and
+    commits everything it has collected in one transaction once
+    ``flush_rows`` rows are pending or ``flush_interval`` seconds have
+    passed, so parallel fetchers never compete for the database lock.
+    A commit that fails with ``OperationalError`` (for example a lock held
+    by another process past the busy timeout) is rolled back and retried
+    with a growing pause; the rows stay queued meanwhile.
+    """
+
+    _STOP = object()
+    # Attempts per commit and the pause before the first retry (doubles)
+    FLUSH_ATTEMPTS = 5
+    RETRY_DELAY = 0.5
+
+    def __init__(self, db_file: str, flush_interval: float = 1.0, flush_rows: int = 5000) -> None:
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.rows_written = 0
+        self.transactions = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._error: Exception | None = None
+        self._storage = DataStorage(db_file, check_same_thread=False)
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def insert_open_interest(self, symbol: str, data: Iterable[dict]) -> None:
+        self._put("open_interest", ohlc_rows(symbol, data))
+
+    def insert_funding_rate(self, symbol: str, data: Iterable[dict]) -> None:
+        self._put("funding_rate", ohlc_rows(symbol, data))
+
+    def insert_long_short_ratio(self, symbol: str, exchange: str, data: Iterable[dict]) -> None:
+        self._put("long_short_ratio", long_short_rows(symbol, exchange, data))
+
+    def insert_liquidations(self, symbol: str, data: Iterable[dict]) -> None:
+        self._put("liquidations", liquidation_rows(symbol, data))
+
+    def _put(self, table: str, rows: list[tuple]) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"SQLite writer stopped: {self._error}")
+        if rows:
+            self._queue.put((table, rows))
+
+    def _flush(self, pending: dict[str, list[tuple]]) -> None:
+        count = sum(len(rows) for rows in pending.values())
+        if not count:
+            return
+        delay = self.RETRY_DELAY
+        for attempt in range(1, self.FLUSH_ATTEMPTS + 1):
+            try:
+                for table, rows in pending.items():
+                    self._storage.write_rows(table, rows, commit=False)
+                self._storage.conn.commit()
+                break
+            except sqlite3.OperationalError as exc:
+                self._storage.conn.rollback()
+                if attempt == self.FLUSH_ATTEMPTS:
+                    raise
+                logging.warning(
+                    "SQLite commit failed (%s); retrying in %.1fs", exc, delay
+                )
+                time.sleep(delay)
+                delay *= 2
+            except sqlite3.Error:
+                self._storage.conn.rollback()
+                raise
+        self.rows_written += count
+        self.transactions += 1
+        pending.clear()
+
+    def _run(self) -> None:
+        pending: dict[str, list[tuple]] = {}
+        size = 0
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+                if item is self._STOP:
+                    break
+                if item is not None:
+                    table, rows = item
+                    pending.setdefault(table, []).extend(rows)
+                    size += len(rows)
+                if size >= self.flush_rows or time.monotonic() >= deadline:
+                    self._flush(pending)
+                    size = 0
+                    deadline = time.monotonic() + self.flush_interval
+            self._flush(pending)
+        except Exception as exc:  # surface in close() and further inserts
+            logging.error("SQLite writer failed: %s", exc)
+            self._error = exc
+
+    def close(self) -> None:
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self._storage.close()
+        if self._error is not None:
+            raise RuntimeError(f"SQLite writer failed: {self._error}")
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="Download futures data from Coinglass into SQLite",
@@ -215,40 +387,178 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--exchange", default="Binance", help="Exchange name for ratios")
     parser.add_argument("--interval", default="4h", help="Data interval (>=4h for Hobbyist)")
     parser.add_argument("--db-file", default="coinglass_data.db", help="SQLite database file")
+    parser.add_argument(
+        "--archive-dir",
+        help="Also append fetched series to a memory-mapped archive in this directory",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of symbols fetched in parallel",
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=20,
+        help="Maximum requests per minute, shared by all workers",
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=1.0,
+        help="Seconds between database commits",
+    )
+    parser.add_argument(
+        "--flush-rows",
+        type=int,
+        default=5000,
+        help="Commit early once this many rows are pending",
+    )
+    parser.add_argument(
+        "--alerts",
+        action="store_true",
+        help="Check each new batch for liquidation spikes and funding flips",
+    )
+    parser.add_argument("--alerts-file", help="Append alerts to this NDJSON file (implies --alerts)")
+    parser.add_argument(
+        "--alerts-state",
+        help="Keep alert state in this JSON file between runs (implies --alerts)",
+    )
+    parser.add_argument(
+        "--liq-imbalance",
+        type=float,
+        default=0.8,
+        help="Share of one side in liquidations that triggers an alert",
+    )
+    parser.add_argument(
+        "--liq-spike",
+        type=float,
+        default=3.0,
+        help="Alert when liquidations exceed this multiple of their recent p90",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        help="Only request the most recent N candles per series",
+    )
+    add_sink_arguments(parser)
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.budget <= 0:
+        parser.error("--budget must be positive")
+    if args.flush_interval <= 0:
+        parser.error("--flush-interval must be greater than 0")
+    if args.flush_rows < 1:
+        parser.error("--flush-rows must be at least 1")
+    if args.alerts or args.alerts_file or args.alerts_state:
+        try:
+            interval_seconds(args.interval)
+        except ValueError as exc:
+            parser.error(str(exc))
     args.api_key = args.api_key or env_key
     if not args.api_key:
         parser.error("An API key is required. Use --api-key or set COINGLASS_API_KEY.")
     return args
 
 
+def collect_symbol(
+    client: CoinglassClient,
+    storage,
+    symbol: str,
+    args: argparse.Namespace,
+    engine: AlertEngine | None = None,
+    sinks=None,
+) -> None:
+    """Fetch every statistic for ``symbol`` and hand it to ``storage``.
+
+    When ``engine`` is given, funding and liquidation batches are also
+    checked for alerts. ``sinks`` receive the raw rows with the symbol
+    added, in addition to the SQLite tables.
+    """
+
+    def publish(dataset: str, key: str, rows: list[dict], **fields) -> None:
+        if args.archive_dir:
+            try:
+                append_rows(args.archive_dir, ENDPOINTS[dataset], key, rows)
+            except (OSError, ValueError) as exc:
+                logging.warning("Failed to archive %s for %s: %s", dataset, key, exc)
+        if sinks:
+            sinks.write(dataset, [{"symbol": symbol, **fields, **row} for row in rows])
+
+    oi = client.fetch_open_interest(symbol, args.interval)
+    storage.insert_open_interest(symbol, oi)
+    publish("open_interest", symbol, oi)
+
+    fr = client.fetch_funding_rate(symbol, args.interval)
+    storage.insert_funding_rate(symbol, fr)
+    publish("funding_rate", symbol, fr)
+    if engine:
+        engine.observe("funding_rate", symbol, fr)
+
+    ls = client.fetch_long_short_ratio(symbol, args.exchange, args.interval)
+    storage.insert_long_short_ratio(symbol, args.exchange, ls)
+    publish("long_short_ratio", f"{symbol}_{args.exchange}", ls, exchange=args.exchange)
+
+    liq = client.fetch_liquidations(symbol, args.interval)
+    storage.insert_liquidations(symbol, liq)
+    publish("liquidations", symbol, liq)
+    if engine:
+        engine.observe("liquidations", symbol, liq)
+
+
 def main() -> None:
     args = parse_args()
     logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
-    client = CoinglassClient(args.api_key)
-    storage = DataStorage(args.db_file)
-
+    sinks = open_sinks(args, os.path.dirname(os.path.abspath(args.db_file)))
+    storage = QueuedStorage(args.db_file, args.flush_interval, args.flush_rows)
     symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
 
-    for symbol in symbols:
+    engine = None
+    if args.alerts or args.alerts_file or args.alerts_state:
+        rules = [
+            LiquidationImbalanceRule(threshold=args.liq_imbalance),
+            LiquidationSpikeRule(factor=args.liq_spike),
+            FundingFlipRule(),
+        ]
+        engine = AlertEngine(rules, args.alerts_file, interval_seconds(args.interval))
+        if args.alerts_state:
+            engine.load(args.alerts_state)
+
+    # One client per worker thread; sessions are not shared between threads,
+    # the rate limit is. A replayed cassette has no rate limit.
+    limiter = None if replay_active() else RateLimiter(args.budget)
+    local = threading.local()
+
+    def run(symbol: str) -> None:
+        if not hasattr(local, "client"):
+            local.client = CoinglassClient(args.api_key, limiter=limiter)
+            if args.limit:
+                local.client.default_params["limit"] = args.limit
         try:
-            oi = client.fetch_open_interest(symbol, args.interval)
-            storage.insert_open_interest(symbol, oi)
-
-            fr = client.fetch_funding_rate(symbol, args.interval)
-            storage.insert_funding_rate(symbol, fr)
-
-            ls = client.fetch_long_short_ratio(symbol, args.exchange, args.interval)
-            storage.insert_long_short_ratio(symbol, args.exchange, ls)
-
-            liq = client.fetch_liquidations(symbol, args.interval)
-            storage.insert_liquidations(symbol, liq)
+            collect_symbol(local.client, storage, symbol, args, engine, sinks)
         except Exception as exc:
             logging.error("Failed for %s: %s", symbol, exc)
 
-    storage.close()
-    logging.info("Pipeline completed")
+    try:
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            list(pool.map(run, symbols))
+        storage.close()
+        # Only move the alert state on once the rows it has seen are stored
+        if engine and args.alerts_state:
+            engine.save(args.alerts_state)
+    finally:
+        # Buffered rows are only on disk once the sinks are closed
+        if sinks:
+            sinks.close()
+    logging.info(
+        "Pipeline completed: %d rows in %d transactions",
+        storage.rows_written,
+        storage.transactions,
+    )
+    logging.info(bandwidth.format_report())
 
 
 if __name__ == "__main__":
@@ -10,10 +10,9 @@ the endpoint requires authentication.
 """
 
 import argparse
-import csv
-import json
 import os
 from api_utils import fetch
+from sinks import SnapshotSink, add_sink_arguments, open_sinks
 
 
 
@@ -44,17 +43,6 @@ ENDPOINTS = {
 
 
 
-def save_list_of_dicts(items: list[dict], filepath: str) -> None:
-    """Write a list of dictionaries to ``filepath`` as CSV."""
-    if not items:
-        return
-    fieldnames = list(items[0].keys())
-    with open(filepath, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(items)
-
-
 def main() -> None:
     parser = argparse.ArgumentParser(description="Scrape data from Coinglass and store as CSV files")
     env_key = os.getenv("COINGLASS_API_KEY")
@@ -62,6 +50,7 @@ def main() -> None:
     parser.add_argument("--exchange", help="Exchange for option data", default="Deribit")
     parser.add_argument("--symbol", help="Symbol to query (e.g. BTC)", default="BTC")
     parser.add_argument("--output-dir", help="Directory to store CSV files", default="data")
+    add_sink_arguments(parser)
     args = parser.parse_args()
 
     api_key = args.api_key or env_key
@@ -69,23 +58,29 @@ def main() -> None:
         parser.error("An API key is required. Use --api-key or set COINGLASS_API_KEY.")
 
     os.makedirs(args.output_dir, exist_ok=True)
-
-    for name, meta in ENDPOINTS.items():
-        endpoint = meta["path"]
-        params = {p: getattr(args, p) for p in meta.get("params", [])}
-        try:
-            data = fetch(endpoint, params=params, api_key=api_key)
-            if isinstance(data, dict):
-                content = data.get("data") or data
-            else:
-                content = data
-            if isinstance(content, list):
-                save_list_of_dicts(content, os.path.join(args.output_dir, f"{name}.csv"))
-                print(f"Saved {name} data to {name}.csv")
-            else:
-                print(f"Unexpected format for {name}: {content}")
-        except Exception as exc:
-            print(f"Failed to fetch {name}: {exc}")
+    sinks = open_sinks(args, args.output_dir, lambda **kw: SnapshotSink(args.output_dir, "csv", **kw))
+
+    try:
+        for name, meta in ENDPOINTS.items():
+            endpoint = meta["path"]
+            params = {p: getattr(args, p) for p in meta.get("params", [])}
+            try:
+                data = fetch(endpoint, params=params, api_key=api_key)
+                if isinstance(data, dict):
+                    content = data.get("data") or data
+                else:
+                    content = data
+                if isinstance(content, list):
+                    sinks.write(name, content)
+                    print(f"Fetched {name} data")
+                else:
+                    print(f"Unexpected format for {name}: {content}")
+            except Exception as exc:
+                print(f"Failed to fetch {name}: {exc}")
+    finally:
+        # Buffered rows are only on disk once the sinks are closed
+        sinks.close()
+    print(f"Saved data to {args.output_dir}/")
 
 
 if __name__ == "__main__":
@@ -1,42 +1,71 @@
 import argparse
-import csv
 import os
+from pathlib import Path
 
-from api_utils import fetch
+from sinks import SnapshotSink, add_sink_arguments, open_sinks
+from symbol_batcher import SymbolBatcher
 
+ENDPOINT = "/api/futures/open_interest"
 
 
 
-def save_dict(data: dict, filepath: str) -> None:
-    if not data:
-        return
-    with open(filepath, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=data.keys())
-        writer.writeheader()
-        writer.writerow(data)
-
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Fetch current open interest from Coinglass")
     env_key = os.getenv("COINGLASS_API_KEY")
     parser.add_argument("--api-key", help="Coinglass API key")
-    parser.add_argument("--symbol", default="BTC", help="Trading symbol, e.g. BTC")
-    parser.add_argument("--output", default="current_oi.csv", help="Output CSV file")
+    parser.add_argument(
+        "--symbol",
+        default="BTC",
+        help="Trading symbol, e.g. BTC, or a comma-separated list",
+    )
+    parser.add_argument(
+        "--output",
+        default="current_oi.csv",
+        help="Output CSV file; with several symbols the symbol is appended to the name",
+    )
+    add_sink_arguments(parser)
     args = parser.parse_args()
 
     api_key = args.api_key or env_key
     if not api_key:
         parser.error("An API key is required. Use --api-key or set COINGLASS_API_KEY.")
 
-    data = fetch("/api/futures/open_interest", {"symbol": args.symbol}, api_key=api_key)
-    content = data.get("data") if isinstance(data, dict) else data
-    if isinstance(content, list):
-        if content:
-            content = content[0]
-        else:
-            content = {}
-    save_dict(content, args.output)
-    print(f"Saved current open interest to {args.output}")
+    out = Path(args.output)
+    sinks = open_sinks(
+        args,
+        out.parent,
+        lambda **kw: SnapshotSink(out.parent, "csv", csv_suffix=out.suffix, **kw),
+    )
+
+    symbols = [s.strip() for s in args.symbol.split(",") if s.strip()]
+    batcher = SymbolBatcher(api_key)
+    for symbol in symbols:
+        batcher.add(ENDPOINT, symbol)
+    try:
+        batcher.flush()
+        for symbol in symbols:
+            name = out.stem if len(symbols) == 1 else f"{out.stem}_{symbol}"
+            try:
+                data = batcher.result(ENDPOINT, symbol)
+            except Exception as exc:
+                print(f"Failed to fetch {symbol}: {exc}")
+                continue
+            content = data.get("data") if isinstance(data, dict) else data
+            if isinstance(content, list):
+                if content:
+                    content = content[0]
+                else:
+                    content = {}
+            if not content:
+                print(f"No open interest returned for {symbol}")
+            else:
+                sinks.write(name, content)
+                print(f"Fetched current open interest for {symbol}")
+    finally:
+        # Buffered rows are only on disk once the sinks are closed
+        sinks.close()
+    print(f"Saved current open interest to {out.parent}/")
 
 
 if __name__ == "__main__":
@@ -1,10 +1,10 @@
 import argparse
-import json
 import os
 from pathlib import Path
 import re
 
 from api_utils import fetch
+from sinks import SnapshotSink, add_sink_arguments, open_sinks
 
 DEFAULT_API_KEY = None
 ENDPOINT_FILE = "endpoints.txt"
@@ -33,12 +33,6 @@ def slugify(text: str) -> str:
     return text.strip("_")
 
 
-def save_json(data: dict, base_path: Path) -> None:
-    out_file = base_path.with_suffix(".json")
-    with open(out_file, "w") as f:
-        json.dump(data, f, indent=2)
-
-
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Fetch Coinglass endpoints for a specific category"
@@ -48,6 +42,7 @@ def main() -> None:
     parser.add_argument("--output-dir", default="category_output", help="Directory to store results")
     parser.add_argument("--endpoints", default=ENDPOINT_FILE, help="Path to endpoints list")
     parser.add_argument("--category", required=True, help="Category to fetch (e.g. futures, spot)")
+    add_sink_arguments(parser)
     args = parser.parse_args()
 
     api_key = args.api_key or env_key
@@ -56,19 +51,25 @@ def main() -> None:
 
     out_dir = Path(args.output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
+    sinks = open_sinks(args, out_dir, lambda **kw: SnapshotSink(out_dir, "json", **kw))
 
-    for title, url, cat in load_endpoints(args.endpoints):
-        if cat != args.category:
-            continue
-        file_base = out_dir / slugify(title)
-        try:
-            data = fetch(url, api_key=api_key)
-            save_json(data, file_base)
-            print(f"Fetched {title}")
-        except Exception as exc:
-            with open(file_base.with_suffix(".txt"), "w") as f:
-                f.write(str(exc))
-            print(f"Failed to fetch {title}: {exc}")
+    try:
+        for title, url, cat in load_endpoints(args.endpoints):
+            if cat != args.category:
+                continue
+            file_base = out_dir / slugify(title)
+            try:
+                data = fetch(url, api_key=api_key)
+                sinks.write(slugify(title), data)
+                print(f"Fetched {title}")
+            except Exception as exc:
+                with open(file_base.with_suffix(".txt"), "w") as f:
+                    f.write(str(exc))
+                print(f"Failed to fetch {title}: {exc}")
+    finally:
+        # Buffered rows are only on disk once the sinks are closed
+        sinks.close()
+    print(f"Saved data to {out_dir}/")
 
 
 if __name__ == "__main__":
@@ -1,11 +1,11 @@
 import argparse
-import csv
-import json
 import os
 from pathlib import Path
 import re
 
 from api_utils import fetch
+from sinks import SnapshotSink, add_sink_arguments, open_sinks
+from snapshot_diff import describe_delta, publish_delta
 
 DEFAULT_API_KEY = None
 
@@ -33,56 +33,6 @@ def slugify(text: str) -> str:
     return text.strip("_")
 
 
-def save_response(data: dict | list, base_path: Path, fmt: str = "best") -> None:
-    """Save the response data to ``base_path`` using the chosen format."""
-
-    # Many Coinglass responses wrap the actual content in a ``data`` field.
-    if isinstance(data, dict) and "data" in data:
-        content = data["data"]
-    else:
-        content = data
-
-    # Explicit JSON dump
-    if fmt == "json":
-        out_file = base_path.with_suffix(".json")
-        with open(out_file, "w") as f:
-            json.dump(data, f, indent=2)
-        return
-
-    # Explicit text dump
-    if fmt == "txt":
-        out_file = base_path.with_suffix(".txt")
-        with open(out_file, "w") as f:
-            if isinstance(data, (dict, list)):
-                json.dump(data, f, indent=2)
-            else:
-                f.write(str(data))
-        return
-
-    # CSV requested or best-effort when fmt == "best"
-    if isinstance(content, list) and content and isinstance(content[0], dict):
-        out_file = base_path.with_suffix(".csv")
-        with open(out_file, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=content[0].keys())
-            writer.writeheader()
-            writer.writerows(content)
-        return
-    if isinstance(content, dict):
-        out_file = base_path.with_suffix(".csv")
-        with open(out_file, "w", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=content.keys())
-            writer.writeheader()
-            writer.writerow(content)
-        return
-
-    # If CSV conversion failed or fmt was not 'csv', fall back to text
-    out_file = base_path.with_suffix(".txt")
-    with open(out_file, "w") as f:
-        if isinstance(content, (dict, list)):
-            json.dump(content, f, indent=2)
-        else:
-            f.write(str(content))
-
 def main() -> None:
     parser = argparse.ArgumentParser(
         description="Fetch data from Hobbyist-accessible Coinglass endpoints"
@@ -108,6 +58,13 @@ def main() -> None:
         default="best",
         help="Force a particular output format or use 'best' to auto-detect",
     )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help="Publish market-wide tables as NDJSON deltas instead of full files",
+    )
+
+    add_sink_arguments(parser)
 
     args = parser.parse_args()
 
@@ -117,19 +74,29 @@ def main() -> None:
 
     out_dir = Path(args.output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
+    sinks = open_sinks(
+        args, out_dir, lambda **kw: SnapshotSink(out_dir, args.format, fallback="txt", **kw)
+    )
 
-    for title, url in load_endpoints(args.endpoints):
-        file_base = out_dir / slugify(title)
-        try:
-            data = fetch(url, api_key=api_key)
-            save_response(data, file_base, args.format)
-            print(f"Fetched {title}")
-        except Exception as exc:
-            err_path = file_base.with_suffix(".txt")
-            with open(err_path, "w") as f:
-                f.write(str(exc))
-            print(f"Failed to fetch {title}: {exc}")
-
+    try:
+        for title, url in load_endpoints(args.endpoints):
+            file_base = out_dir / slugify(title)
+            try:
+                data = fetch(url, api_key=api_key)
+                delta = publish_delta(data, file_base, url) if args.delta else None
+                if delta is None:
+                    sinks.write(slugify(title), data)
+                    print(f"Fetched {title}")
+                else:
+                    print(f"Fetched {title} ({describe_delta(delta)})")
+            except Exception as exc:
+                err_path = file_base.with_suffix(".txt")
+                with open(err_path, "w") as f:
+                    f.write(str(exc))
+                print(f"Failed to fetch {title}: {exc}")
+    finally:
+        # Buffered rows are only on disk once the sinks are closed
+        sinks.close()
     print(f"Saved endpoint data to {out_dir}/")
 
 if __name__ == "__main__":
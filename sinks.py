@@ -0,0 +1,431 @@
+"""Buffered output sinks shared by all scripts.
+
+A sink receives ``(name, content)`` pairs where ``content`` is a decoded
+API response (or part of one) and ``name`` identifies the dataset, e.g.
+``futures/coins_markets``. Rows are buffered in memory and written by a
+background thread once ``flush_rows`` rows are pending or every
+``flush_interval`` seconds, so fetching never waits for disk.
+
+Available sinks (select with ``--sink kind[:target]``, repeatable):
+
+========  ====================================  ==========================
+kind      output                                default target
+========  ====================================  ==========================
+csv       ``<dir>/<name>.csv`` (appended)       output directory
+ndjson    ``<dir>/<name>.ndjson`` (appended)    output directory
+json      ``<dir>/<name>.json`` (one array)     output directory
+sqlite    table ``records(name, time, data)``   ``<dir>/records.db``
+parquet   ``<dir>/<name>/part-*.parquet``       output directory
+========  ====================================  ==========================
+
+Parquet needs ``pyarrow`` (``pip install pyarrow``).
+
+Without ``--sink`` each script falls back to a :class:`SnapshotSink`, which
+keeps the latest response per name as a CSV, JSON or text file, replacing
+the file from the previous run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import importlib.util
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+
+def to_rows(content) -> list[dict]:
+    """Normalise a response into a list of dict rows."""
+    if isinstance(content, dict) and "data" in content:
+        content = content["data"]
+    if isinstance(content, dict):
+        return [content] if content else []
+    if isinstance(content, list):
+        return [r if isinstance(r, dict) else {"value": r} for r in content]
+    if content is None:
+        return []
+    return [{"value": content}]
+
+
+class Sink:
+    """Base class that buffers rows and flushes them on a background thread.
+
+    Subclasses implement :meth:`write_batch`, which is only ever called from
+    the flush thread.
+    """
+
+    def __init__(self, flush_rows: int = 1000, flush_interval: float = 5.0) -> None:
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._buffers: dict[str, list[dict]] = {}
+        self._pending = 0
+        self._closing = False
+        self._error: Exception | None = None
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run, name=f"{type(self).__name__}-flush", daemon=True
+        )
+        self._thread.start()
+
+    def write(self, name: str, content) -> None:
+        """Queue ``content`` for ``name``; returns without touching disk."""
+        rows = to_rows(content)
+        if rows:
+            self._enqueue(name, rows)
+
+    def _enqueue(self, name: str, items: list, replace: bool = False) -> None:
+        if self._error is not None:
+            raise RuntimeError(f"{type(self).__name__} failed: {self._error}")
+        with self._cond:
+            if replace:
+                self._pending -= len(self._buffers.get(name, ()))
+                self._buffers[name] = items
+            else:
+                self._buffers.setdefault(name, []).extend(items)
+            self._pending += len(items)
+            if self._pending >= self.flush_rows:
+                self._cond.notify()
+
+    def _take(self) -> dict[str, list[dict]]:
+        buffers, self._buffers = self._buffers, {}
+        self._pending = 0
+        return buffers
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            with self._cond:
+                while not self._closing and self._pending < self.flush_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                buffers = self._take()
+                closing = self._closing
+            try:
+                for name, rows in buffers.items():
+                    self.write_batch(name, rows)
+            except Exception as exc:
+                logging.error("%s failed: %s", type(self).__name__, exc)
+                self._error = exc
+            deadline = time.monotonic() + self.flush_interval
+            if closing:
+                self.finish()
+                return
+
+    def write_batch(self, name: str, rows: list[dict]) -> None:
+        raise NotImplementedError
+
+    def finish(self) -> None:
+        """Release resources; runs on the flush thread after the last batch."""
+
+    def close(self) -> None:
+        """Flush everything that is buffered and stop the flush thread."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        self._thread.join()
+        if self._error is not None:
+            raise RuntimeError(f"{type(self).__name__} failed: {self._error}")
+
+
+class _DirectorySink(Sink):
+    suffix = ""
+
+    def __init__(self, directory: str | Path, **kwargs) -> None:
+        self.directory = Path(directory)
+        super().__init__(**kwargs)
+
+    def path_for(self, name: str) -> Path:
+        path = self.directory / f"{name}{self.suffix}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return path
+
+
+def _fieldnames(rows: list[dict], start: list[str] | None = None) -> list[str]:
+    fieldnames = list(start or [])
+    for row in rows:
+        fieldnames.extend(k for k in row if k not in fieldnames)
+    return fieldnames
+
+
+def _write_csv(path: Path, rows: list[dict]) -> None:
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=_fieldnames(rows))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+class CsvSink(_DirectorySink):
+    """Append rows to one CSV file per name.
+
+    When a batch brings columns the file does not have yet, the file is
+    rewritten once with the wider header so no field is dropped.
+    """
+
+    suffix = ".csv"
+
+    def write_batch(self, name: str, rows: list[dict]) -> None:
+        path = self.path_for(name)
+        header = None
+        if path.exists() and path.stat().st_size:
+            with open(path, newline="") as f:
+                header = next(csv.reader(f), None)
+        if not header:
+            _write_csv(path, rows)
+            return
+        fieldnames = _fieldnames(rows, header)
+        if len(fieldnames) > len(header):
+            with open(path, newline="") as f:
+                old = list(csv.DictReader(f))
+            tmp = path.with_name(f".{path.name}.tmp")
+            with open(tmp, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                writer.writerows(old)
+            os.replace(tmp, path)
+        with open(path, "a", newline="") as f:
+            csv.DictWriter(f, fieldnames=fieldnames).writerows(rows)
+
+
+class NdjsonSink(_DirectorySink):
+    """Append rows as JSON lines, one file per name."""
+
+    suffix = ".ndjson"
+
+    def write_batch(self, name: str, rows: list[dict]) -> None:
+        with open(self.path_for(name), "a") as f:
+            for row in rows:
+                f.write(json.dumps(row, separators=(",", ":")) + "\n")
+
+
+class JsonSink(_DirectorySink):
+    """Write all rows of a run as one JSON array per name.
+
+    The first flush replaces the file; later flushes overwrite only the
+    closing bracket, so each flush costs the size of its own batch and the
+    file is a valid array after every flush.
+    """
+
+    suffix = ".json"
+    _CLOSE = b"\n]\n"
+
+    def __init__(self, directory: str | Path, **kwargs) -> None:
+        # Offset of the closing bracket per name
+        self._ends: dict[str, int] = {}
+        super().__init__(directory, **kwargs)
+
+    def write_batch(self, name: str, rows: list[dict]) -> None:
+        body = ",\n".join(json.dumps(row) for row in rows).encode()
+        path = self.path_for(name)
+        if name not in self._ends:
+            with open(path, "wb") as f:
+                f.write(b"[\n" + body)
+                self._ends[name] = f.tell()
+                f.write(self._CLOSE)
+            return
+        with open(path, "r+b") as f:
+            f.seek(self._ends[name])
+            f.write(b",\n" + body)
+            self._ends[name] = f.tell()
+            f.write(self._CLOSE)
+
+
+class SqliteSink(Sink):
+    """Store rows as JSON documents in an SQLite ``records`` table."""
+
+    def __init__(self, db_file: str | Path, **kwargs) -> None:
+        self.db_file = str(db_file)
+        self._conn = None
+        super().__init__(**kwargs)
+
+    def write_batch(self, name: str, rows: list[dict]) -> None:
+        if self._conn is None:
+            import sqlite3
+
+            # Created on the flush thread, the only thread that uses it
+            Path(self.db_file).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_file, timeout=30)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS records (name TEXT, time INTEGER, data TEXT)"
+            )
+        now = int(time.time() * 1000)
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO records VALUES (?, ?, ?)",
+                [(name, now, json.dumps(row, separators=(",", ":"))) for row in rows],
+            )
+
+    def finish(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+
+
+class ParquetSink(_DirectorySink):
+    """Write each flushed batch as a new Parquet file under ``<name>/``."""
+
+    def __init__(self, directory: str | Path, **kwargs) -> None:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as exc:
+            raise RuntimeError("The parquet sink needs pyarrow. Install it with pip.") from exc
+        self._parts = 0
+        super().__init__(directory, **kwargs)
+
+    def write_batch(self, name: str, rows: list[dict]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        folder = self.directory / name
+        folder.mkdir(parents=True, exist_ok=True)
+        self._parts += 1
+        path = folder / f"part-{int(time.time() * 1000)}-{self._parts:05d}.parquet"
+        pq.write_table(pa.Table.from_pylist(rows), path)
+
+
+class SnapshotSink(_DirectorySink):
+    """Keep the latest response per name as a file, like a plain download.
+
+    ``fmt`` selects the file type: ``json`` and ``txt`` store the response
+    as received; ``csv`` and ``best`` unwrap the ``data`` field and write a
+    table (or a single flat object) as CSV, falling back to ``fallback``
+    (``json`` or ``txt``) for anything else. Empty responses leave no file.
+    CSV files are named ``<name><csv_suffix>``, so a script can honour an
+    output file name given by the user.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        fmt: str = "best",
+        fallback: str = "json",
+        csv_suffix: str = ".csv",
+        **kwargs,
+    ) -> None:
+        self.fmt = fmt
+        self.fallback = fallback
+        self.csv_suffix = csv_suffix
+        super().__init__(directory, **kwargs)
+
+    def write(self, name: str, content) -> None:
+        # Whole responses are kept, a newer one for the same name wins
+        self._enqueue(name, [content], replace=True)
+
+    def write_batch(self, name: str, items: list) -> None:
+        content = items[-1]
+        fmt = self.fmt
+        if fmt in ("csv", "best"):
+            if isinstance(content, dict) and "data" in content:
+                content = content["data"]
+            if content is None or content == [] or content == {}:
+                return
+            flat = isinstance(content, dict) and not any(
+                isinstance(v, (dict, list)) for v in content.values()
+            )
+            if flat or (isinstance(content, list) and all(isinstance(r, dict) for r in content)):
+                _write_csv(self.path_for(f"{name}{self.csv_suffix}"), to_rows(content))
+                return
+            fmt = self.fallback
+        with open(self.path_for(f"{name}.{fmt}"), "w") as f:
+            if fmt == "json" or isinstance(content, (dict, list)):
+                json.dump(content, f, indent=2)
+            else:
+                f.write(str(content))
+
+
+SINKS = {
+    "csv": CsvSink,
+    "ndjson": NdjsonSink,
+    "json": JsonSink,
+    "sqlite": SqliteSink,
+    "parquet": ParquetSink,
+}
+
+
+class MultiSink:
+    """Send every write to several sinks."""
+
+    def __init__(self, sinks: list[Sink]) -> None:
+        self.sinks = sinks
+
+    def write(self, name: str, content) -> None:
+        for sink in self.sinks:
+            sink.write(name, content)
+
+    def close(self) -> None:
+        errors = []
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except RuntimeError as exc:
+                errors.append(str(exc))
+        if errors:
+            raise RuntimeError("; ".join(errors))
+
+
+def make_sink(spec: str, default_dir: str | Path, **kwargs) -> Sink:
+    """Create a sink from ``kind[:target]``."""
+    kind, _, target = spec.partition(":")
+    kind = kind.lower()
+    if kind not in SINKS:
+        raise ValueError(f"Unknown sink '{kind}'. Choose from: {', '.join(SINKS)}")
+    if not target:
+        target = Path(default_dir) / "records.db" if kind == "sqlite" else default_dir
+    return SINKS[kind](target, **kwargs)
+
+
+def sink_spec(spec: str) -> str:
+    """``argparse`` type for ``--sink`` that rejects unusable sinks early."""
+    kind = spec.partition(":")[0].lower()
+    if kind not in SINKS:
+        raise argparse.ArgumentTypeError(
+            f"unknown sink '{kind}'; choose from: {', '.join(SINKS)}"
+        )
+    if kind == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        raise argparse.ArgumentTypeError("the parquet sink needs pyarrow; install it with pip")
+    return spec
+
+
+def add_sink_arguments(parser) -> None:
+    """Add the ``--sink`` options shared by all scripts to ``parser``."""
+    parser.add_argument(
+        "--sink",
+        action="append",
+        type=sink_spec,
+        metavar="KIND[:TARGET]",
+        help=f"Write output to a sink instead of the default files; repeatable ({', '.join(SINKS)})",
+    )
+    parser.add_argument(
+        "--sink-flush-rows",
+        type=int,
+        default=1000,
+        help="Flush a sink once this many rows are buffered",
+    )
+    parser.add_argument(
+        "--sink-flush-interval",
+        type=float,
+        default=5.0,
+        help="Flush sinks at least this often (seconds)",
+    )
+
+
+def open_sinks(
+    args, default_dir: str | Path, default: Callable[..., Sink] | None = None
+) -> MultiSink | None:
+    """Return a :class:`MultiSink` for ``args.sink``.
+
+    Without ``--sink`` the script's usual output is built by calling
+    ``default`` with the flush options; ``None`` is returned when there is
+    no default either.
+    """
+    options = {"flush_rows": args.sink_flush_rows, "flush_interval": args.sink_flush_interval}
+    if args.sink:
+        return MultiSink([make_sink(spec, default_dir, **options) for spec in args.sink])
+    if default is None:
+        return None
+    return MultiSink([default(**options)])
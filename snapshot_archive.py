@@ -0,0 +1,302 @@
+"""Memory-mapped archive of historical Coinglass time series.
+
+Backtests and replay jobs read the same collector output over and over.
+Parsing thousands of JSON/CSV files on every pass is slow, so this module
+stores each (endpoint, symbol) series as one small binary file with fixed
+width columns:
+
+* a 24 byte header (magic, column count, row count)
+* one 32 byte, NUL padded ASCII name per column
+* the ``time`` column as little-endian int64, followed by every value
+  column as little-endian float64
+
+Readers ``mmap`` the file and hand out zero-copy views of the columns, so
+opening a series is nearly free and several processes share the same page
+cache. Writers replace files atomically, which means a reader that already
+mapped an older version keeps a consistent view.
+
+Example::
+
+    archive = SnapshotArchive("archive")
+    with archive.series("/api/futures/open-interest/aggregated-history", "BTC") as s:
+        times = s.array("time")
+        closes = s.array("close")
+"""
+
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, writers must not overlap
+    fcntl = None
+
+MAGIC = b"CGARC001"
+HEADER = struct.Struct("<8sIIQ")  # magic, column count, reserved, row count
+NAME_SIZE = 32
+SUFFIX = ".cga"
+
+# Field names that hold the timestamp of a row, in order of preference
+TIME_FIELDS = ("time", "timestamp")
+
+
+def endpoint_slug(endpoint: str) -> str:
+    """Turn an endpoint URL or path into a directory name."""
+    path = endpoint.split("://", 1)[-1]
+    path = path.split("/api/", 1)[-1] if "/api/" in path else path.split("/", 1)[-1]
+    path = path.split("?", 1)[0].lower()
+    return re.sub(r"[^a-z0-9]+", "_", path).strip("_")
+
+
+def series_path(root: str | Path, endpoint: str, symbol: str) -> Path:
+    """Return the archive file used for ``symbol`` on ``endpoint``."""
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", symbol) or "ALL"
+    return Path(root) / endpoint_slug(endpoint) / f"{name}{SUFFIX}"
+
+
+def _time_field(row: dict) -> str | None:
+    for field in TIME_FIELDS:
+        if field in row:
+            return field
+    return None
+
+
+def _to_float(value) -> float | None:
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _columns_from_rows(rows: Iterable[dict]) -> tuple[list[str], dict[int, dict[str, float]]]:
+    """Collect numeric columns from ``rows`` keyed by timestamp."""
+    fields: list[str] = []
+    by_time: dict[int, dict[str, float]] = {}
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        tf = _time_field(row)
+        if tf is None:
+            continue
+        try:
+            ts = int(row[tf])
+        except (TypeError, ValueError):
+            continue
+        values = by_time.setdefault(ts, {})
+        for key, raw in row.items():
+            if key == tf:
+                continue
+            value = _to_float(raw)
+            if value is None:
+                continue
+            if key not in fields:
+                fields.append(key)
+            values[key] = value
+    return fields, by_time
+
+
+@contextmanager
+def _locked(path: Path):
+    """Hold an exclusive lock for ``path`` across threads and processes."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(f".{path.name}.lock"), "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def write_series(path: str | Path, rows: Iterable[dict]) -> int:
+    """Merge ``rows`` into the archive file at ``path``.
+
+    Rows are keyed by their timestamp; a newer row replaces an archived
+    row with the same time. Non-numeric fields are dropped. Returns the
+    number of rows in the resulting file (0 means nothing was written).
+    The read-merge-replace runs under a lock file, so concurrent writers
+    of the same series, in this or another process, do not lose rows.
+    """
+    path = Path(path)
+    fields, by_time = _columns_from_rows(rows)
+    if not by_time:
+        return 0
+    with _locked(path):
+        return _merge_and_replace(path, fields, by_time)
+
+
+def _merge_and_replace(path: Path, fields: list[str], by_time: dict[int, dict[str, float]]) -> int:
+    if path.exists():
+        with ArchivedSeries(path) as old:
+            old_fields = [c for c in old.columns if c != "time"]
+            old_times = old.column("time").tolist()
+            old_cols = {c: old.column(c).tolist() for c in old_fields}
+        merged: dict[int, dict[str, float]] = {}
+        for i, ts in enumerate(old_times):
+            merged[ts] = {c: old_cols[c][i] for c in old_fields}
+        for ts, values in by_time.items():
+            merged.setdefault(ts, {}).update(values)
+        by_time = merged
+        fields = old_fields + [f for f in fields if f not in old_fields]
+
+    names = ["time"] + fields
+    for name in names:
+        if len(name.encode("ascii", "replace")) > NAME_SIZE:
+            raise ValueError(f"Column name too long for archive: {name}")
+
+    times = sorted(by_time)
+    with tempfile.NamedTemporaryFile(
+        "wb", dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False
+    ) as f:
+        try:
+            f.write(HEADER.pack(MAGIC, len(names), 0, len(times)))
+            for name in names:
+                f.write(name.encode("ascii", "replace").ljust(NAME_SIZE, b"\0"))
+            _write_column(f, array("q", times))
+            for field in fields:
+                _write_column(
+                    f, array("d", (by_time[ts].get(field, math.nan) for ts in times))
+                )
+        except BaseException:
+            f.close()
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, path)
+    return len(times)
+
+
+def _write_column(f, column: array) -> None:
+    if sys.byteorder != "little":
+        column.byteswap()
+    column.tofile(f)
+
+
+def append_rows(root: str | Path, endpoint: str, symbol: str, rows) -> Path | None:
+    """Archive ``rows`` returned by ``endpoint`` for ``symbol``.
+
+    ``rows`` may be a raw API response; the ``data`` field is unwrapped.
+    Returns the archive path, or ``None`` when the rows contain no time
+    series that can be archived.
+    """
+    if isinstance(rows, dict):
+        rows = rows.get("data", [])
+    if not isinstance(rows, list):
+        return None
+    path = series_path(root, endpoint, symbol)
+    return path if write_series(path, rows) else None
+
+
+class ArchivedSeries:
+    """Read-only, memory-mapped view of one archived series.
+
+    Views returned by :meth:`column` and :meth:`array` point straight into
+    the mapping. They stay valid after :meth:`close`; the file is unmapped
+    once the last view is garbage collected.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, ncols, _, nrows = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"Not a Coinglass archive: {self.path}")
+        self.rows = nrows
+        offset = HEADER.size
+        self.columns: list[str] = []
+        for _ in range(ncols):
+            raw = self._mm[offset : offset + NAME_SIZE]
+            self.columns.append(raw.rstrip(b"\0").decode("ascii"))
+            offset += NAME_SIZE
+        self._offsets = {}
+        for name in self.columns:
+            self._offsets[name] = offset
+            offset += nrows * 8
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __enter__(self) -> "ArchivedSeries":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _typecode(self, name: str) -> str:
+        return "q" if name == "time" else "d"
+
+    def _mapping(self) -> mmap.mmap:
+        if self._mm is None:
+            raise ValueError(f"Archive series is closed: {self.path}")
+        return self._mm
+
+    def column(self, name: str) -> memoryview:
+        """Return a zero-copy ``memoryview`` of column ``name``."""
+        mm = self._mapping()
+        if name not in self._offsets:
+            raise KeyError(name)
+        start = self._offsets[name]
+        view = memoryview(mm)[start : start + self.rows * 8]
+        return view.cast(self._typecode(name))
+
+    def array(self, name: str):
+        """Return column ``name`` as a read-only, zero-copy NumPy array."""
+        try:
+            import numpy as np
+        except ImportError as exc:
+            raise RuntimeError("NumPy is required for array(). Install it with pip.") from exc
+        mm = self._mapping()
+        if name not in self._offsets:
+            raise KeyError(name)
+        dtype = "<i8" if name == "time" else "<f8"
+        return np.frombuffer(mm, dtype=dtype, count=self.rows, offset=self._offsets[name])
+
+    def close(self) -> None:
+        if self._mm is None:
+            return
+        try:
+            self._mm.close()
+        except BufferError:
+            # Views are still alive and keep the mapping referenced; it is
+            # unmapped when the last of them is collected.
+            pass
+        self._mm = None
+
+
+class SnapshotArchive:
+    """Directory of archived series written by the collector and pipeline."""
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def series(self, endpoint: str, symbol: str) -> ArchivedSeries:
+        """Open the series for ``symbol`` on ``endpoint``."""
+        path = series_path(self.root, endpoint, symbol)
+        if not path.exists():
+            raise FileNotFoundError(f"No archived data for {symbol} at {endpoint}")
+        return ArchivedSeries(path)
+
+    def list_series(self) -> list[tuple[str, str]]:
+        """Return ``(endpoint_slug, symbol)`` pairs present in the archive."""
+        return sorted(
+            (p.parent.name, p.stem) for p in self.root.glob(f"*/*{SUFFIX}")
+        )
+
+    def append(self, endpoint: str, symbol: str, rows) -> Path | None:
+        """Shortcut for :func:`append_rows` on this archive."""
+        return append_rows(self.root, endpoint, symbol, rows)
@@ -0,0 +1,177 @@
+"""Keyed diffs of market-wide table endpoints.
+
+Endpoints such as ``/api/futures/coins-markets`` return a row for every
+coin on each call, although most rows barely change between two sweeps.
+Instead of republishing the whole table this module compares the new
+snapshot with the previous one by key (symbol, or exchange and pair) and
+appends only the differences to an NDJSON delta stream:
+
+    {"time": 1718000000000, "endpoint": "...", "key": ["symbol"],
+     "inserted": [{...full row...}],
+     "changed": [{"symbol": "BTC", "price": 67012.5}],
+     "dropped": [{"symbol": "ETH", "fields": ["funding_rate"]}],
+     "removed": [{"symbol": "XYZ"}]}
+
+Changed rows only carry the key fields plus the fields that differ (a
+value may legitimately be ``null``). Fields that disappeared from a row
+are listed under ``dropped``. Rows without the key fields, or repeating
+a key, cannot be diffed; they are logged and left out of the stream. The
+last snapshot is kept next to the stream so the next run can diff against
+it. Consumers rebuild the table with :func:`apply_delta`.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+import urllib.parse
+from pathlib import Path
+
+# Endpoint path -> fields identifying a row
+KEY_FIELDS = {
+    "/api/futures/coins-markets": ("symbol",),
+    "/api/futures/pairs-markets": ("exchange_name", "instrument_id"),
+    "/api/futures/coins-price-change": ("symbol",),
+    "/api/spot/coins-markets": ("symbol",),
+    "/api/spot/pairs-markets": ("exchange_name", "instrument_id"),
+}
+
+
+def key_fields_for(url: str) -> tuple[str, ...] | None:
+    """Return the key fields for ``url`` or ``None`` if it is not keyed."""
+    path = urllib.parse.urlsplit(url).path.rstrip("/")
+    return KEY_FIELDS.get(path)
+
+
+def _row_key(row: dict, key: tuple[str, ...]):
+    try:
+        return tuple(row[k] for k in key)
+    except KeyError:
+        return None
+
+
+def index_rows(rows: list[dict], key: tuple[str, ...]) -> dict:
+    """Map the key of every row to the row; rows without a key are dropped."""
+    return _index_rows(rows, key)[0]
+
+
+def _index_rows(rows: list[dict], key: tuple[str, ...]) -> tuple[dict, int]:
+    """Return the index and how many rows were unkeyed or duplicates."""
+    index = {}
+    skipped = 0
+    for row in rows:
+        k = _row_key(row, key) if isinstance(row, dict) else None
+        if k is None or k in index:
+            skipped += 1
+            continue
+        index[k] = row
+    return index, skipped
+
+
+def diff_snapshots(old_rows: list[dict], new_rows: list[dict], key: tuple[str, ...]) -> dict:
+    """Return inserted, changed, dropped and removed rows between two snapshots.
+
+    ``skipped`` counts new rows that had no key or repeated a key.
+    """
+    old = index_rows(old_rows, key)
+    new, skipped = _index_rows(new_rows, key)
+    inserted, changed, dropped, removed = [], [], [], []
+    for k, row in new.items():
+        before = old.get(k)
+        if before is None:
+            inserted.append(row)
+            continue
+        if before == row:
+            continue
+        delta = dict(zip(key, k))
+        for field, value in row.items():
+            if field not in before or before[field] != value:
+                delta[field] = value
+        if len(delta) > len(key):
+            changed.append(delta)
+        gone = [field for field in before if field not in row]
+        if gone:
+            dropped.append({**dict(zip(key, k)), "fields": gone})
+    for k in old:
+        if k not in new:
+            removed.append(dict(zip(key, k)))
+    return {
+        "inserted": inserted,
+        "changed": changed,
+        "dropped": dropped,
+        "removed": removed,
+        "skipped": skipped,
+    }
+
+
+def apply_delta(rows: list[dict], delta: dict) -> list[dict]:
+    """Apply a delta produced by :func:`diff_snapshots` to ``rows``."""
+    key = tuple(delta["key"])
+    index = index_rows(rows, key)
+    for gone in delta.get("removed", []):
+        index.pop(_row_key(gone, key), None)
+    for row in delta.get("inserted", []):
+        index[_row_key(row, key)] = dict(row)
+    for change in delta.get("changed", []):
+        k = _row_key(change, key)
+        index[k] = {**index.get(k, {}), **change}
+    for drop in delta.get("dropped", []):
+        row = index.get(_row_key(drop, key))
+        if row is not None:
+            index[_row_key(drop, key)] = {
+                f: v for f, v in row.items() if f not in drop["fields"]
+            }
+    return list(index.values())
+
+
+def publish_delta(data, base_path: Path, url: str) -> dict | None:
+    """Append the delta of ``data`` against the last snapshot of ``base_path``.
+
+    Writes ``<base>.ndjson`` (the delta stream) and ``<base>.snapshot.json``
+    (the state for the next diff). Returns the delta, or ``None`` if ``url``
+    is not a keyed endpoint. Nothing is appended when the table is unchanged.
+    """
+    key = key_fields_for(url)
+    if key is None:
+        return None
+    rows = data.get("data", []) if isinstance(data, dict) else data
+    if not isinstance(rows, list):
+        return None
+
+    snapshot_file = base_path.with_suffix(".snapshot.json")
+    old_rows = []
+    if snapshot_file.exists():
+        with open(snapshot_file, "r") as f:
+            old_rows = json.load(f)
+
+    delta = diff_snapshots(old_rows, rows, key)
+    skipped = delta.pop("skipped")
+    if skipped:
+        logging.warning(
+            "%s: %d rows without a unique %s were left out of the delta",
+            url,
+            skipped,
+            "/".join(key),
+        )
+    delta = {
+        "time": int(time.time() * 1000),
+        "endpoint": url,
+        "key": list(key),
+        **delta,
+    }
+    if delta["inserted"] or delta["changed"] or delta["dropped"] or delta["removed"]:
+        with open(base_path.with_suffix(".ndjson"), "a") as f:
+            f.write(json.dumps(delta, separators=(",", ":")) + "\n")
+    # Replace atomically so a crash never leaves a truncated snapshot behind
+    tmp = snapshot_file.with_name(f".{snapshot_file.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(rows, f, separators=(",", ":"))
+    os.replace(tmp, snapshot_file)
+    return delta
+
+
+def describe_delta(delta: dict) -> str:
+    changed = len(delta["changed"]) + len(delta["dropped"])
+    return f"+{len(delta['inserted'])} ~{changed} -{len(delta['removed'])}"
@@ -0,0 +1,202 @@
+"""Plan which endpoints to fetch when the request budget is tight.
+
+The collector used to walk ``endpoints.txt`` top to bottom with a fixed
+delay. When only part of a sweep fits into the available quota, slow
+moving lists (supported coins, ETF lists) should not take slots away from
+fast moving data such as liquidations and funding rates.
+
+The planner keeps a small JSON file of observations per endpoint URL:
+
+* ``latency``  - moving average of the request time in seconds
+* ``bytes``    - moving average of the payload size
+* ``fetches``  - how often the endpoint was fetched
+* ``changes``  - how often the payload differed from the previous fetch
+* ``digest``   - hash of the last payload, used to detect changes
+* ``last_fetched`` / ``waiting_since`` - when the endpoint was last fetched,
+  or since when it has been deferred without ever being fetched
+
+Each endpoint gets a score of ``priority * change_rate * staleness / cost``
+where ``cost`` is the number of rate-limit slots a request occupies (a
+request slower than the slot spacing blocks more than one) and
+``staleness`` grows by one for every ``STALENESS_SCALE`` seconds since the
+last fetch. Deferred endpoints therefore keep gaining score until they
+rotate back in. The schedule is the endpoints sorted by score, cut off
+when the sweep window is full.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import time
+from pathlib import Path
+from typing import Iterable
+
+# Weight of the newest observation in the moving averages
+EWMA_ALPHA = 0.3
+# Seconds after which an unfetched endpoint's score has doubled
+STALENESS_SCALE = 3600.0
+
+
+def load_stats(path: str | Path | None) -> dict:
+    """Return stored observations, or an empty dict if there are none."""
+    if not path or not Path(path).exists():
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def save_stats(stats: dict, path: str | Path) -> None:
+    tmp = Path(f"{path}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(stats, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def load_priorities(path: str | Path | None) -> dict[str, float]:
+    """Load a JSON object mapping URL fragments to priorities.
+
+    Example: ``{"liquidation": 5, "funding-rate": 4, "supported-coins": 0.2}``
+    """
+    if not path:
+        return {}
+    with open(path, "r") as f:
+        return {str(k): float(v) for k, v in json.load(f).items()}
+
+
+def priority_for(url: str, priorities: dict[str, float], default: float = 1.0) -> float:
+    """Return the priority of the longest fragment contained in ``url``."""
+    best = None
+    for fragment in priorities:
+        if fragment in url and (best is None or len(fragment) > len(best)):
+            best = fragment
+    return priorities[best] if best is not None else default
+
+
+def payload_digest(data) -> tuple[str, int]:
+    """Return a digest and size (in bytes) of a decoded response."""
+    raw = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha1(raw).hexdigest(), len(raw)
+
+
+def record_fetch(stats: dict, url: str, latency: float, data, size: int | None = None) -> None:
+    """Update the observations for ``url`` after a successful fetch."""
+    digest, raw_size = payload_digest(data)
+    if size is None:
+        size = raw_size
+    now = time.time()
+    entry = stats.get(url)
+    if entry is None or "fetches" not in entry:
+        stats[url] = {
+            "latency": latency,
+            "bytes": size,
+            "fetches": 1,
+            "changes": 0,
+            "digest": digest,
+            "last_fetched": now,
+        }
+        return
+    entry["last_fetched"] = now
+    entry["latency"] += EWMA_ALPHA * (latency - entry["latency"])
+    entry["bytes"] += EWMA_ALPHA * (size - entry["bytes"])
+    entry["fetches"] += 1
+    if entry.get("digest") != digest:
+        entry["changes"] += 1
+    entry["digest"] = digest
+
+
+def change_rate(entry: dict | None) -> float:
+    """Estimated chance that the next fetch returns new data.
+
+    Uses a Laplace estimate so endpoints that were never fetched start at
+    0.5 and are not starved.
+    """
+    if not entry or "fetches" not in entry:
+        return 0.5
+    # The first fetch cannot be compared with anything
+    comparisons = max(entry["fetches"] - 1, 0)
+    return (entry["changes"] + 1) / (comparisons + 2)
+
+
+def plan_sweep(
+    endpoints: Iterable[tuple[str, str, str]],
+    stats: dict,
+    priorities: dict[str, float],
+    budget: float,
+    window: float | None = None,
+    now: float | None = None,
+) -> tuple[list[dict], list[dict]]:
+    """Order ``endpoints`` by value per slot and fit them into the window.
+
+    ``endpoints`` yields ``(title, url, category)`` tuples as produced by
+    ``load_endpoints``. ``budget`` is the allowed requests per minute and
+    ``window`` the length of the sweep in minutes (``None`` keeps every
+    endpoint). Returns ``(schedule, deferred)``; schedule entries carry the
+    planned start offset in seconds. Deferred endpoints that were never
+    fetched get a ``waiting_since`` mark in ``stats`` so their age counts.
+    """
+    if now is None:
+        now = time.time()
+    if budget <= 0:
+        raise ValueError("Budget must be a positive number of requests per minute")
+    spacing = 60.0 / budget
+    candidates = []
+    for title, url, category in endpoints:
+        entry = stats.get(url) or {}
+        latency = entry.get("latency", 0.0)
+        size = entry.get("bytes", 0)
+        seen = entry.get("last_fetched", entry.get("waiting_since", now))
+        age = max(0.0, now - seen)
+        staleness = 1 + age / STALENESS_SCALE
+        slots = max(1, math.ceil(latency / spacing)) if latency else 1
+        priority = priority_for(url, priorities)
+        rate = change_rate(entry)
+        candidates.append(
+            {
+                "title": title,
+                "url": url,
+                "category": category,
+                "priority": priority,
+                "change_rate": rate,
+                "latency": latency,
+                "bytes": size,
+                "slots": slots,
+                "age": age,
+                "score": priority * rate * staleness / slots,
+            }
+        )
+    candidates.sort(key=lambda c: (-c["score"], c["bytes"], c["latency"]))
+
+    limit = None if window is None else window * 60.0
+    schedule, deferred = [], []
+    elapsed = 0.0
+    for item in candidates:
+        duration = item["slots"] * spacing
+        if item["priority"] <= 0 or (limit is not None and elapsed + duration > limit):
+            entry = stats.setdefault(item["url"], {})
+            if "last_fetched" not in entry:
+                entry.setdefault("waiting_since", now)
+            deferred.append(item)
+            continue
+        item["start"] = elapsed
+        elapsed += duration
+        schedule.append(item)
+    return schedule, deferred
+
+
+def format_plan(schedule: list[dict], deferred: list[dict]) -> str:
+    """Return a human readable table of the planned sweep."""
+    lines = [
+        f"{'start':>7}  {'score':>6}  {'prio':>5}  {'change':>6}  {'age h':>6}  {'kB':>7}  title"
+    ]
+    for item in schedule:
+        lines.append(
+            f"{item['start']:7.1f}  {item['score']:6.2f}  {item['priority']:5.1f}  "
+            f"{item['change_rate']:6.2f}  {item['age'] / 3600:6.1f}  "
+            f"{item['bytes'] / 1024:7.1f}  {item['title']}"
+        )
+    if deferred:
+        lines.append(f"Deferred ({len(deferred)}): " + ", ".join(d["title"] for d in deferred))
+    return "\n".join(lines)
@@ -0,0 +1,194 @@
+"""Group single-symbol requests so quota scales with endpoints, not symbols.
+
+Monitoring 50 coins with a per-symbol endpoint costs 50 requests, even
+when one market-wide or multi-symbol call could answer for every coin at
+once. The batcher collects pending ``(endpoint, symbol)`` requests and,
+on :meth:`flush`,
+
+1. routes them through the matching market-wide endpoint
+   (``MARKET_ROUTES``), or
+2. packs them into comma-separated ``symbol`` calls for endpoints known to
+   accept several symbols (``MULTI_SYMBOL_ENDPOINTS``), or
+3. falls back to one request per symbol.
+
+Results are split back per symbol and wrapped in the usual
+``{"code": ..., "msg": ..., "data": [...]}`` envelope, so callers unwrap
+them exactly like a response from ``api_utils.fetch``. A market-wide row
+does not have the same fields as the per-symbol response, so every route
+carries an explicit projection and callers get the projected row instead.
+Symbols missing from a batched response, and single pending symbols, are
+fetched directly.
+
+Current routes:
+
+* ``/api/futures/open_interest`` -> ``/api/futures/coins-markets``, keeping
+  ``symbol``, ``current_price``, ``open_interest_usd``,
+  ``open_interest_quantity`` and the ``open_interest_change_percent_*``
+  fields. The per-exchange breakdown of the single-symbol endpoint is not
+  available from the market-wide table.
+
+Example::
+
+    batcher = SymbolBatcher(api_key)
+    for symbol in ("BTC", "ETH", "SOL"):
+        batcher.add("/api/futures/open_interest", symbol)
+    batcher.flush()
+    btc = batcher.result("/api/futures/open_interest", "BTC")
+"""
+
+from __future__ import annotations
+
+from typing import Callable
+
+from api_utils import fetch
+
+# Fields of a ``/api/futures/coins-markets`` row that describe open interest
+COINS_MARKETS_OI_FIELDS = (
+    "symbol",
+    "current_price",
+    "open_interest_usd",
+    "open_interest_quantity",
+)
+
+
+def coins_markets_open_interest(row: dict) -> dict:
+    """Project a ``coins-markets`` row onto its open interest fields."""
+    return {
+        key: value
+        for key, value in row.items()
+        if key in COINS_MARKETS_OI_FIELDS or key.startswith("open_interest_change_percent")
+    }
+
+
+# Single-symbol endpoint -> (market-wide endpoint, field holding the symbol,
+# function turning a market-wide row into the row callers receive)
+MARKET_ROUTES: dict[str, tuple[str, str, Callable[[dict], dict]]] = {
+    "/api/futures/open_interest": (
+        "/api/futures/coins-markets",
+        "symbol",
+        coins_markets_open_interest,
+    ),
+}
+
+# Endpoints that accept ``symbol=BTC,ETH`` -> field holding the symbol in rows
+MULTI_SYMBOL_ENDPOINTS: dict[str, str] = {}
+
+# Largest number of symbols packed into one multi-symbol request
+MAX_SYMBOLS_PER_REQUEST = 20
+
+
+def _envelope(response, rows: list) -> dict:
+    if isinstance(response, dict):
+        return {"code": response.get("code", "0"), "msg": response.get("msg", "success"), "data": rows}
+    return {"code": "0", "msg": "success", "data": rows}
+
+
+def _rows(response) -> list:
+    content = response.get("data") if isinstance(response, dict) else response
+    return content if isinstance(content, list) else []
+
+
+def _split_by_symbol(
+    response, field: str, symbols: list[str], project: Callable[[dict], dict] | None = None
+) -> dict[str, dict]:
+    """Split ``response`` per symbol; symbols without rows are left out."""
+    wanted = {s.upper(): s for s in symbols}
+    grouped: dict[str, list] = {}
+    for row in _rows(response):
+        if isinstance(row, dict):
+            symbol = wanted.get(str(row.get(field, "")).upper())
+            if symbol is not None:
+                grouped.setdefault(symbol, []).append(project(row) if project else row)
+    return {s: _envelope(response, rows) for s, rows in grouped.items()}
+
+
+class SymbolBatcher:
+    """Collect single-symbol requests and execute them in as few calls as possible."""
+
+    def __init__(self, api_key: str | None = None, min_batch: int = 2) -> None:
+        self.api_key = api_key
+        self.min_batch = min_batch
+        self.requests_sent = 0
+        self._pending: dict[tuple, list[str]] = {}
+        self._results: dict[tuple, object] = {}
+
+    @staticmethod
+    def _group_key(endpoint: str, params: dict | None) -> tuple:
+        other = tuple(sorted((k, v) for k, v in (params or {}).items() if k != "symbol"))
+        return endpoint, other
+
+    def add(self, endpoint: str, symbol: str, params: dict | None = None) -> None:
+        """Queue a request for ``symbol`` with any extra ``params``."""
+        symbols = self._pending.setdefault(self._group_key(endpoint, params), [])
+        if symbol not in symbols:
+            symbols.append(symbol)
+
+    def _fetch(self, endpoint: str, params: dict | None):
+        self.requests_sent += 1
+        return fetch(endpoint, params or None, api_key=self.api_key)
+
+    def _store(self, group: tuple, results: dict[str, object]) -> None:
+        for symbol, value in results.items():
+            self._results[(group, symbol)] = value
+
+    def _run_group(self, group: tuple, symbols: list[str]) -> None:
+        endpoint, other = group
+        params = dict(other)
+
+        found: dict[str, dict] = {}
+        if len(symbols) >= self.min_batch and endpoint in MARKET_ROUTES:
+            market, field, project = MARKET_ROUTES[endpoint]
+            try:
+                found = _split_by_symbol(self._fetch(market, None), field, symbols, project)
+            except Exception:
+                found = {}
+        elif len(symbols) >= self.min_batch and endpoint in MULTI_SYMBOL_ENDPOINTS:
+            field = MULTI_SYMBOL_ENDPOINTS[endpoint]
+            for i in range(0, len(symbols), MAX_SYMBOLS_PER_REQUEST):
+                chunk = symbols[i : i + MAX_SYMBOLS_PER_REQUEST]
+                try:
+                    response = self._fetch(endpoint, {**params, "symbol": ",".join(chunk)})
+                    found.update(_split_by_symbol(response, field, chunk))
+                except Exception:
+                    pass
+        self._store(group, found)
+
+        # Anything the batched call did not answer is requested on its own
+        for symbol in (s for s in symbols if s not in found):
+            try:
+                self._store(group, {symbol: self._fetch(endpoint, {**params, "symbol": symbol})})
+            except Exception as exc:
+                self._store(group, {symbol: exc})
+
+    def flush(self) -> None:
+        """Execute every pending request."""
+        pending, self._pending = self._pending, {}
+        for group, symbols in pending.items():
+            self._run_group(group, symbols)
+
+    def result(self, endpoint: str, symbol: str, params: dict | None = None):
+        """Return the response for ``symbol``, raising the error if it failed."""
+        key = (self._group_key(endpoint, params), symbol)
+        if key not in self._results:
+            raise KeyError(f"No result for {symbol} at {endpoint}; call flush() first")
+        value = self._results[key]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def fetch_many(
+    endpoint: str, symbols: list[str], params: dict | None = None, api_key: str | None = None
+) -> dict[str, object]:
+    """Fetch ``endpoint`` for every symbol; failed symbols map to the exception."""
+    batcher = SymbolBatcher(api_key)
+    for symbol in symbols:
+        batcher.add(endpoint, symbol, params)
+    batcher.flush()
+    results = {}
+    for symbol in symbols:
+        try:
+            results[symbol] = batcher.result(endpoint, symbol, params)
+        except Exception as exc:
+            results[symbol] = exc
+    return results